@@ -4,35 +4,646 @@ Author: Benjamin Gutierrez
 Date: 3/19/2020
 """
 
-
+import argparse
+import hashlib
+import json
+import math
+import mmap
+import os
+import random
+import shelve
+import struct
+import sys
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+try:
+    import resource
+except ImportError: # not available on windows, peak memory is not reported
+    resource = None
+
+try:
+    import numpy as np
+except ImportError: # numpy is optional, guesses are scored in pure python without it
+    np = None
+
+
+
+
+
+# 16 bit popcount lookup table for numpy versions without bitwise_count
+_POPCOUNT_TABLE = None
+
+# process pools used by Jotto.searchGuessesParallel, {numWorkers: executor}
+_EXECUTORS = {}
+
+# dictionaries shared by every Jotto instance, {absolute filename: {wordLength: WordIndex,...}}
+_DICTIONARIES = {}
+_DICTIONARIES_LOCK = threading.Lock()
+
+# opening books shared by every Jotto instance, {absolute book filename: book or None}
+_OPENING_BOOKS = {}
+
+# sha256 of each word file, {absolute filename: hex digest}
+_DICTIONARY_IDS = {}
+
+# binary dictionary cache layout, see Jotto.buildDictionaryCache
+_CACHE_MAGIC = b"JOTTOIDX"
+_CACHE_VERSION = 2
+# magic, version, source size, source mtime (ns), source sha256, number of word lengths
+_CACHE_HEADER = struct.Struct("<8sIQQ32sI")
+# word length, number of words, offset of masks, offset of words
+_CACHE_ENTRY = struct.Struct("<IIQQ")
+
+
+
+class GuessCache:
+    """ Least recently used cache of best guesses, keyed by a hash of the game state
+
+        Entries are evicted once there are more than maxEntries of them or
+        their approximate size exceeds maxBytes. If filename is given, entries
+        are also written to a shelve file there, which is read on a miss.
+        Safe to share between threads
+    """
+    def __init__(self, maxEntries=100000, maxBytes=64 * 1024 * 1024, filename=None):
+        self.maxEntries = maxEntries
+        self.maxBytes = maxBytes
+        self.filename = filename
+        self.entries = OrderedDict() # {key: (value, numBytes),...}, least recently used first
+        self.numBytes = 0
+        self.hits = 0
+        self.diskHits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        """ Returns the value cached for key, or None """
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return self.entries[key][0]
+            if self.filename is not None:
+                with shelve.open(self.filename) as disk:
+                    value = disk.get(key)
+                if value is not None:
+                    self.diskHits += 1
+                    self._store(key, value)
+                    return value
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        """ Caches value for key """
+        with self.lock:
+            if key in self.entries:
+                self.numBytes -= self.entries.pop(key)[1]
+            self._store(key, value)
+            if self.filename is not None:
+                with shelve.open(self.filename) as disk:
+                    disk[key] = value
+
+    def _store(self, key, value):
+        numBytes = sys.getsizeof(key) + sys.getsizeof(value)
+        self.entries[key] = (value, numBytes)
+        self.numBytes += numBytes
+        while self.entries and (len(self.entries) > self.maxEntries or self.numBytes > self.maxBytes):
+            _, (_, evictedBytes) = self.entries.popitem(last=False)
+            self.numBytes -= evictedBytes
+            self.evictions += 1
+
+    def clear(self):
+        """ Removes every entry held in memory and resets the stats """
+        with self.lock:
+            self.entries.clear()
+            self.numBytes = 0
+            self.hits = self.diskHits = self.misses = self.evictions = 0
+
+    def getStats(self):
+        """ Returns a dict of the number of entries, their approximate size in bytes,
+            hits, disk hits, misses and evictions
+        """
+        with self.lock:
+            return {
+                "entries": len(self.entries),
+                "bytes": self.numBytes,
+                "hits": self.hits,
+                "diskHits": self.diskHits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+
+class JottoStats:
+    """ Counters and timers of the work done for a game, see Jotto.stats
+
+        Counters count events, e.g. "probesScored", and timers add up the
+        calls and seconds of a phase, e.g. "pickWord". Phases can nest,
+        e.g. "trimLetters" includes its calls to "updateKeptRemovedLetters".
+        The stats of several games add up with merge
+    """
+    def __init__(self):
+        self.counters = {} # {name: count,...}
+        self.timers = {} # {phase: [calls, seconds, slowest call in seconds],...}
+
+    def count(self, name, n=1):
+        """ Adds n to counter name """
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def addTime(self, phase, seconds):
+        """ Adds one call of phase that took seconds """
+        timer = self.timers.get(phase)
+        if timer is None:
+            self.timers[phase] = [1, seconds, seconds]
+        else:
+            timer[0] += 1
+            timer[1] += seconds
+            timer[2] = max(timer[2], seconds)
+
+    def merge(self, other):
+        """ Adds the counters and timers of other, a JottoStats or a dict
+            returned by getStats, e.g. from another process. Returns self
+        """
+        if isinstance(other, JottoStats):
+            other = other.getStats()
+        for name, n in other["counters"].items():
+            self.count(name, n)
+        for phase, timer in other["timers"].items():
+            calls, seconds, maxSeconds = self.timers.get(phase, (0, 0.0, 0.0))
+            self.timers[phase] = [calls + timer["calls"], seconds + timer["seconds"],
+                                  max(maxSeconds, timer["maxSeconds"])]
+        return self
+
+    def clear(self):
+        """ Resets every counter and timer """
+        self.counters.clear()
+        self.timers.clear()
+
+    def getStats(self):
+        """ Returns a dict that can be written as json:
+            {"counters": {name: count,...},
+             "timers": {phase: {"calls": calls, "seconds": total seconds,
+                                "maxSeconds": slowest call},...}}
+        """
+        return {
+            "counters": dict(self.counters),
+            "timers": {phase: {"calls": calls, "seconds": seconds, "maxSeconds": maxSeconds}
+                       for phase, (calls, seconds, maxSeconds) in self.timers.items()},
+        }
 
 
 
 class Jotto:
-    def __init__(self):
-        # keeps track of the remaining jotto words
-        self.words = Jotto.getJottoWords()
-        self.allWords = set(self.words)
+    ALPHABET = "abcdefghijklmnopqrstuvwxyz"
+    # next to this file, so games can be started from any working directory
+    DICTIONARY_FILENAME = os.path.join(os.path.dirname(os.path.abspath(__file__)), "scrabble_words.txt")
+
+    # best guesses of game states, shared by every instance. None disables caching
+    guessCache = GuessCache()
+    LOOKAHEAD_WORDS = 150 # most remaining words to search several guesses ahead for
+    SCENARIOS = ("worst", "average", "expected", "entropy") # see scoreBucketsFor
+
+    def __init__(self, filename=DICTIONARY_FILENAME, answersFilename=None):
+        """ Parameters:
+            filename (string): word file of the words that can be guessed
+            answersFilename (string): optional word file of the words that can be the
+                                      jotto word, usually a smaller list of common words.
+                                      If None, any word of filename can be the jotto word
+        """
+        self.filename = filename
+        self.answersFilename = answersFilename
+        self.dictionary = Jotto.getDictionary(filename) # {wordLength: WordIndex,...}, shared
+        self.answerDictionary = self.dictionary
+        if answersFilename is not None:
+            self.answerDictionary = Jotto.getDictionary(answersFilename)
+        self.index = None # WordIndex of allWords, set once the word length is known
+        # WordIndex of the words that can be guessed, self.index without an answer list
+        self.guessIndex = None
+        # keeps track of the remaining jotto words,
+        # bit i is set if self.index.words[i] is a remaining word
+        self.candidates = 0
         self.wordLength = None
         self.keptLetters = set()
         self.removedLetters = set()
+        self.keptMask = 0 # letter masks of self.keptLetters and self.removedLetters
+        self.removedMask = 0
         self.guesses = {} # {guess1:numMatches1,...}
+        self.unknownWords = set() # words the other player does not know, never guessed again
+        self.deductions = [] # [(guesses, lettersKept, lettersRemoved),...] made by the last update
+        # True once pickWord kept words by at least a number of matches, only then can
+        # deductions remove words, every remaining word matches exact guesses already
+        self.inexactGuesses = False
+        self.scenario = "worst" # scenario nextGuess searches for one guess ahead, see calculateGuess
+        # seconds nextGuess may spend searching, if None it searches fully below 500 remaining words
+        self.timeBudget = None
+        self.workers = None # processes nextGuess splits calculateGuess across, None to search in this process
+        # guesses nextGuess searches ahead below LOOKAHEAD_WORDS remaining words, 0 to only search one
+        self.lookaheadDepth = 3
+        self.lastSearch = None # see calculateGuess
+        self.stats = None # JottoStats to count and time the work done, None to not measure it
+        self.policy = None # decision tree from analyzeGames that nextGuess follows, see getPolicyGuess
 
     @staticmethod
-    def getJottoWords():
+    def getJottoWords(filename=DICTIONARY_FILENAME):
         """ Gets words from scrabble word file, and returns valid jotto words"""
-        filename = "scrabble_words.txt"
-        fileHandle = open(filename, "r") # open filename read only
-        scrabbleWords = []
-        for line in fileHandle:
-            word = line.strip()
-            word = word.lower()
-            scrabbleWords.append(word)
-        jottoWords = []
-        for word in scrabbleWords:
-            if Jotto.isJottoWord(word):
-                jottoWords.append(word)
-        return set(jottoWords)
+        jottoWords = set()
+        for words in Jotto.readWordsByLength(filename).values():
+            jottoWords |= words
+        return jottoWords
+
+    @staticmethod
+    def readWordsByLength(source=DICTIONARY_FILENAME, alphabet=ALPHABET):
+        """ Reads the jotto words of a word list, partitioned by length
+
+            Words are read one at a time, so memory use is bounded by the
+            jotto words kept rather than by the size of the word list.
+            Words are lowercased and deduplicated, and only kept if they are
+            jotto words made of letters in alphabet
+
+            Parameters:
+            source (string or iterable): path of a word file with one word per line,
+                                         or an iterable of words, e.g. an open file
+            alphabet (string): letters the words may use, a subset of Jotto.ALPHABET
+                               since letter masks only have a bit for each of its letters
+            Returns:
+            (dict): {wordLength: set of words,...}
+
+            Jotto instances, the CLI and the server only load word files, with the
+            full alphabet. To play other words, write them to a word file first
+        """
+        allowedLetters = set(alphabet)
+        if not allowedLetters <= set(Jotto.ALPHABET):
+            raise ValueError("alphabet must only have letters of " + Jotto.ALPHABET)
+        if isinstance(source, (str, bytes, os.PathLike)):
+            # letters outside of the alphabet are dropped with their words anyway
+            with open(source, "r", encoding="utf-8", errors="replace") as fileHandle:
+                return Jotto.readWordsByLength(fileHandle, alphabet)
+
+        wordsByLength = {}
+        for line in source:
+            word = line.strip().lower()
+            if word and Jotto.isJottoWord(word) and allowedLetters.issuperset(word):
+                wordsByLength.setdefault(len(word), set()).add(word)
+        return wordsByLength
+
+    @property
+    def words(self):
+        """ set of the remaining jotto words """
+        if self.index is None:
+            return set()
+        words = self.index.words
+        return {words[i] for i in Jotto.bitsetToPositions(self.candidates)}
+
+    @words.setter
+    def words(self, words):
+        positions = self.index.positions
+        self.candidates = Jotto.positionsToBitset([positions[word] for word in words if word in positions])
+
+    @property
+    def allWords(self):
+        """ WordIndex of every jotto word of the current length """
+        if self.index is None:
+            return WordIndex([])
+        return self.index
+
+    def isGuessable(self, word):
+        """ Returns True if word can be guessed: a word of the guess list or of the answer list """
+        return self.index is not None and (word in self.guessIndex or word in self.index)
+
+    def countWords(self):
+        """ Returns the number of remaining jotto words """
+        return Jotto.popcount(self.candidates)
+
+    def discardWord(self, word):
+        """ Removes word from the remaining jotto words, if it is one of them """
+        if self.index is None:
+            return
+        i = self.index.positions.get(word)
+        if i is not None:
+            self.candidates &= ~(1 << i)
+
+    def markUnknown(self, word):
+        """ Removes a word the other player does not know from the remaining words,
+            and from the words the solver may guess
+        """
+        self.unknownWords.add(word)
+        self.discardWord(word)
+
+    def getCandidatePositions(self):
+        """ Returns the positions in self.index of the remaining jotto words """
+        return Jotto.bitsetToPositions(self.candidates)
+
+    @staticmethod
+    def getDictionary(filename=DICTIONARY_FILENAME):
+        """ Returns the dictionary of a word file, see loadDictionary
+            The dictionary is only loaded once per process and is shared by
+            every Jotto instance, so it must not be modified
+        """
+        key = os.path.abspath(filename)
+        with _DICTIONARIES_LOCK:
+            if key not in _DICTIONARIES:
+                _DICTIONARIES[key] = Jotto.loadDictionary(filename)
+            return _DICTIONARIES[key]
+
+    @staticmethod
+    def getFileDigest(filename):
+        """ Returns the sha256 digest of a file's contents,
+            read in chunks so large word files are never held in memory
+        """
+        digest = hashlib.sha256()
+        with open(filename, "rb") as fileHandle:
+            for chunk in iter(lambda: fileHandle.read(1 << 20), b""):
+                digest.update(chunk)
+        return digest.digest()
+
+    @staticmethod
+    def getDictionaryId(filename=DICTIONARY_FILENAME):
+        """ Returns the hex sha256 of a word file, computed once per process """
+        key = os.path.abspath(filename)
+        if key not in _DICTIONARY_IDS:
+            _DICTIONARY_IDS[key] = Jotto.getFileDigest(filename).hex()
+        return _DICTIONARY_IDS[key]
+
+    @staticmethod
+    def getCacheFilename(filename):
+        """ Returns the filename of the binary dictionary cache of word file filename """
+        return filename + ".idx"
+
+    @staticmethod
+    def loadDictionary(filename=DICTIONARY_FILENAME):
+        """ Loads the jotto words of a word file from its binary dictionary cache,
+            building the cache first if it is missing or out of date
+            Parameters:
+            filename (string): word file, one word per line
+            Returns:
+            (dict): {wordLength: WordIndex,...}
+        """
+        dictionary = Jotto.readDictionaryCache(filename)
+        if dictionary is None:
+            try:
+                Jotto.buildDictionaryCache(filename)
+            except OSError: # cache can't be written next to the word file, index in memory instead
+                return {wordLength: WordIndex(words)
+                        for wordLength, words in Jotto.readWordsByLength(filename).items()}
+            dictionary = Jotto.readDictionaryCache(filename)
+        return dictionary
+
+    @staticmethod
+    def buildDictionaryCache(filename=DICTIONARY_FILENAME):
+        """ Writes the binary dictionary cache of a word file
+
+            The cache holds a header identifying the word file by size,
+            modification time and sha256, a table with one entry per word length,
+            then for each word length a uint32 array of letter masks followed by
+            the sorted words as fixed width ascii
+
+            Parameters:
+            filename (string): word file, one word per line
+            Returns:
+            (string): filename of the cache
+        """
+        digest = Jotto.getFileDigest(filename)
+        fileStat = os.stat(filename)
+
+        wordsByLength = Jotto.readWordsByLength(filename)
+        wordLengths = sorted(wordsByLength)
+
+        entries = []
+        sections = []
+        offset = _CACHE_HEADER.size + _CACHE_ENTRY.size * len(wordLengths)
+        for wordLength in wordLengths:
+            words = sorted(wordsByLength[wordLength])
+            masks = array("I", [Jotto.wordToMask(word) for word in words]).tobytes()
+            wordBytes = "".join(words).encode("ascii")
+            padding = bytes(-(offset + len(masks) + len(wordBytes)) % 4) # keep mask arrays aligned
+            entries.append(_CACHE_ENTRY.pack(wordLength, len(words), offset, offset + len(masks)))
+            sections.extend([masks, wordBytes, padding])
+            offset += len(masks) + len(wordBytes) + len(padding)
+
+        header = _CACHE_HEADER.pack(_CACHE_MAGIC, _CACHE_VERSION, fileStat.st_size,
+                                    fileStat.st_mtime_ns, digest, len(wordLengths))
+        cacheFilename = Jotto.getCacheFilename(filename)
+        # unique to this process and thread, so concurrent builds don't write to the same file
+        temporaryFilename = "{}.{}.{}.tmp".format(cacheFilename, os.getpid(), threading.get_ident())
+        try:
+            with open(temporaryFilename, "wb") as fileHandle:
+                fileHandle.write(header)
+                fileHandle.writelines(entries)
+                fileHandle.writelines(sections)
+            os.replace(temporaryFilename, cacheFilename) # readers never see a partial cache
+        except BaseException:
+            if os.path.exists(temporaryFilename):
+                os.remove(temporaryFilename)
+            raise
+        return cacheFilename
+
+    @staticmethod
+    def readDictionaryCache(filename=DICTIONARY_FILENAME):
+        """ Memory maps the binary dictionary cache of a word file
+            Parameters:
+            filename (string): word file, one word per line
+            Returns:
+            (dict): {wordLength: WordIndex,...} backed by the mapped cache,
+                    or None if the cache is missing, truncated or does not match the word file
+        """
+        try:
+            with open(Jotto.getCacheFilename(filename), "rb") as fileHandle:
+                cache = mmap.mmap(fileHandle.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError): # missing, or empty and can't be mapped
+            return None
+
+        if len(cache) < _CACHE_HEADER.size:
+            cache.close()
+            return None
+        magic, version, size, mtime, digest, numLengths = _CACHE_HEADER.unpack_from(cache, 0)
+        if magic != _CACHE_MAGIC or version != _CACHE_VERSION:
+            cache.close()
+            return None
+
+        # only hash the word file when its size or modification time changed
+        fileStat = os.stat(filename)
+        if (fileStat.st_size, fileStat.st_mtime_ns) != (size, mtime):
+            if Jotto.getFileDigest(filename) != digest:
+                cache.close()
+                return None
+
+        # every section must lie inside the mapped file, else the cache was cut short
+        entries = []
+        try:
+            for i in range(numLengths):
+                entry = _CACHE_ENTRY.unpack_from(cache, _CACHE_HEADER.size + i * _CACHE_ENTRY.size)
+                wordLength, numWords, masksOffset, wordsOffset = entry
+                if (masksOffset % 4 != 0 or masksOffset + 4 * numWords > len(cache)
+                        or wordsOffset + wordLength * numWords > len(cache)):
+                    raise ValueError("dictionary cache section out of bounds")
+                entries.append(entry)
+        except (struct.error, ValueError):
+            cache.close()
+            return None
+
+        buffer = memoryview(cache)
+        dictionary = {}
+        for wordLength, numWords, masksOffset, wordsOffset in entries:
+            masks = buffer[masksOffset:masksOffset + 4 * numWords].cast("I")
+            wordBytes = buffer[wordsOffset:wordsOffset + wordLength * numWords]
+            dictionary[wordLength] = WordIndex.fromBuffer(wordLength, wordBytes, masks)
+        return dictionary
+
+    @staticmethod
+    def getBookFilename(filename, answersFilename=None):
+        """ Returns the filename of the opening book of word file filename,
+            or of answer file answersFilename if given
+        """
+        if answersFilename is not None:
+            return os.path.splitext(answersFilename)[0] + "_book.json"
+        return os.path.splitext(filename)[0] + "_book.json"
+
+    @staticmethod
+    def buildOpeningBook(filename=DICTIONARY_FILENAME, scenario="worst", wordLengths=range(2, 16),
+                         answersFilename=None):
+        """ Computes the opening book of a word file and writes it next to the word file
+
+            For each word length the book holds the best first guess over every
+            word of that length, and for every number of matches of the first
+            guess, the best second guess. Both are found with an exhaustive
+            calculateGuess, exactly as a game would compute them
+
+            Parameters:
+            filename (string): word file, one word per line
+            scenario (string): scenario passed to calculateGuess
+            wordLengths (iterable): word lengths to compute the book for
+            answersFilename (string): optional answer file, see Jotto
+            Returns:
+            (string): filename of the opening book
+        """
+        book = {}
+        for wordLength in wordLengths:
+            J = Jotto(filename, answersFilename)
+            J.keepWordsOfLength(wordLength)
+            J.wordLength = wordLength
+            if J.countWords() == 0:
+                continue
+            firstGuess = J.calculateGuess(scenario, exhaustive=True)
+
+            secondGuesses = {}
+            for numMatches in range(wordLength + 1):
+                J = Jotto(filename, answersFilename)
+                J.keepWordsOfLength(wordLength)
+                J.wordLength = wordLength
+                J.pickWord(firstGuess, numMatches)
+                J.discardWord(firstGuess)
+                if J.countWords() > 0:
+                    secondGuesses[str(numMatches)] = J.calculateGuess(scenario, exhaustive=True)
+            book[str(wordLength)] = {"guess": firstGuess, "next": secondGuesses}
+
+        bookFilename = Jotto.getBookFilename(filename, answersFilename)
+        header = {"source": Jotto.getDictionaryId(filename), "scenario": scenario, "book": book}
+        if answersFilename is not None:
+            header["answers"] = Jotto.getDictionaryId(answersFilename)
+        with open(bookFilename, "w") as fileHandle:
+            json.dump(header, fileHandle, indent=1, sort_keys=True)
+        return bookFilename
+
+    @staticmethod
+    def getOpeningBook(filename=DICTIONARY_FILENAME, answersFilename=None):
+        """ Returns the opening book of a word file, loaded once per process
+            Parameters:
+            filename (string): word file, one word per line
+            answersFilename (string): optional answer file, see Jotto
+            Returns:
+            (dict): {"scenario": scenario, "book": {wordLength: {"guess": firstGuess,
+                    "next": {numMatches: secondGuess,...}},...}} with string keys,
+                    or None if there is no book for the word file
+        """
+        bookFilename = os.path.abspath(Jotto.getBookFilename(filename, answersFilename))
+        answersId = Jotto.getDictionaryId(answersFilename) if answersFilename is not None else None
+        key = (bookFilename, os.path.abspath(filename), answersId)
+        with _DICTIONARIES_LOCK:
+            if key not in _OPENING_BOOKS:
+                book = None
+                try:
+                    with open(bookFilename, "r") as fileHandle:
+                        book = json.load(fileHandle)
+                    if book["source"] != Jotto.getDictionaryId(filename) or book.get("answers") != answersId:
+                        book = None # built from different word files
+                except (OSError, ValueError, KeyError):
+                    book = None
+                _OPENING_BOOKS[key] = book
+            return _OPENING_BOOKS[key]
+
+    def getBookGuess(self, scenario):
+        """ Returns the opening book's guess for the current game, or None
+            if the game has left the book or there is no book for scenario
+        """
+        if len(self.guesses) > 1:
+            return None
+        book = Jotto.getOpeningBook(self.filename, self.answersFilename)
+        if book is None or book["scenario"] != scenario:
+            return None
+        entry = book["book"].get(str(self.wordLength))
+        if entry is None:
+            return None
+
+        # the book only applies if the remaining words are exactly
+        # those of the book's line, e.g. no words were marked unknown
+        allCandidates = (1 << len(self.index)) - 1
+        if len(self.guesses) == 0:
+            if self.candidates != allCandidates or entry["guess"] in self.unknownWords:
+                return None
+            return entry["guess"]
+
+        firstGuess = entry["guess"]
+        numMatches = self.guesses.get(firstGuess)
+        if numMatches is None:
+            return None
+        expectedCandidates = self.getMatchBitsets(self.getMask(firstGuess), allCandidates)[numMatches]
+        i = self.index.positions.get(firstGuess)
+        if i is not None:
+            expectedCandidates &= ~(1 << i)
+        if self.candidates != expectedCandidates:
+            return None
+        guess = entry["next"].get(str(numMatches))
+        return guess if guess not in self.unknownWords else None
+
+    @staticmethod
+    def readPolicy(policyFilename):
+        """ Returns a policy written by analyzeGames, see getPolicyGuess """
+        with open(policyFilename, "r") as fileHandle:
+            return json.load(fileHandle)
+
+    def getPolicyGuess(self):
+        """ Returns the guess of self.policy for the current game, or None if there is no
+            policy, it was built from other word files, or the game has left it
+
+            The policy is a decision tree as built by analyzeGames:
+            {"guess": guess, "words": number of remaining words,
+             "next": {numMatches: node,...}} with string keys
+        """
+        policy = self.policy
+        if policy is None or policy["wordLength"] != self.wordLength:
+            return None
+        answersId = Jotto.getDictionaryId(self.answersFilename) if self.answersFilename is not None else None
+        if policy["source"] != Jotto.getDictionaryId(self.filename) or policy.get("answers") != answersId:
+            return None
+
+        # follow the guesses made so far, in order
+        node = policy["tree"]
+        for guess, numMatches in self.guesses.items():
+            if node["guess"] != guess:
+                return None
+            node = node["next"].get(str(numMatches))
+            if node is None:
+                return None
+        # e.g. words were marked unknown or letters removed by hand
+        if node["words"] != self.countWords() or node["guess"] in self.unknownWords:
+            return None
+        return node["guess"]
 
     def keepWordsOfLength(self, wordLength):
         """ Keeps all jotto words of a certain word length
@@ -42,138 +653,286 @@ class Jotto:
             Returns:
             None
         """
-        newWords = []
-        for word in self.words:
-            if len(word) == wordLength:
-                newWords.append(word)
-        self.words = set(newWords)
-        self.allWords = set(self.words)
+        self.index = self.answerDictionary.get(wordLength, WordIndex([]))
+        self.guessIndex = self.dictionary.get(wordLength, WordIndex([]))
+        self.candidates = (1 << len(self.index)) - 1
         return
 
-    def pickWord(self, word, numMatches):
+    def getMask(self, word):
+        """ Returns the letter mask of word, using the precomputed
+            mask from self.index when word is in the dictionary
+        """
+        if self.index is None:
+            return Jotto.wordToMask(word)
+        return self.index.getMask(word)
+
+    def pickWord(self, word, numMatches, atLeast=False):
         """ Shrinks self.words such as to only keep words that
             could possibly have the number of letter matches given
             Parameters:
             word (string): word to shrink
             numMatches (int): number of letter matches
                               ( 0 <= nuMatches <= len(word) )
+            atLeast (bool): if True, keep words with at least numMatches
+                            letters in common with word instead of exactly
+                            numMatches
             Returns:
             None
         """
-        # set of letters in word
-        letters = Jotto.wordToSet(word)
-
-        # remove words that have any letters in word if
-        # there are no matches
-        if numMatches == 0:
-            newWords = []
-            for currentWord in self.words:
-                currentLetters = Jotto.wordToSet(currentWord)
-                if currentLetters.intersection(letters) == set():
-                    newWords.append(currentWord)
-            self.words = set(newWords)
-            return
-
-        #else there are some matches
-        allLetterCombinations = Jotto.getLetterCombinations(word)
-
-        # only keep letter combinations that are of length of number of matches
-        letterCombinations = []
-        for letterCombination in allLetterCombinations: 
-            if len(letterCombination) == numMatches:
-                letterCombinations.append(letterCombination)
-
-        # check if there is a letter combination in word
-        newWords = []
-        for currentWord in self.words:
-            for letterCombination in letterCombinations:
-                if Jotto.isCombinationInWord(letterCombination, currentWord):
-                    newWords.append(currentWord)
-                    break
-        self.words = set(newWords)
+        stats = self.stats
+        if stats is not None:
+            start = time.perf_counter()
+            numWords = self.countWords()
+
+        # letter mask of word
+        letters = self.getMask(word)
+
+        # remaining words split by their number of letters in common with word
+        matchBitsets = self.getMatchBitsets(letters)
+        if atLeast:
+            newCandidates = 0
+            for matchBitset in matchBitsets[numMatches:]:
+                newCandidates |= matchBitset
+            self.candidates = newCandidates
+        else:
+            self.candidates = matchBitsets[numMatches]
+
+        if stats is not None:
+            stats.count("candidatesFiltered", numWords - self.countWords())
+            stats.addTime("pickWord", time.perf_counter() - start)
 
         #-----
-        # By this point we have kept all words that have a combination of valid letters
-        # now see if we can remove words by seeing if there are any letters
-        # we can figure out
+        # By this point we have kept all words that have the right number of matches.
+        # Words kept by at least numMatches may still be ruled out by letters
+        # we can figure out, exact matches leave nothing to deduce
         self.guesses[word] = numMatches
-        self.trimLetters()
+        if atLeast:
+            self.inexactGuesses = True
+        if self.inexactGuesses:
+            self.trimLetters(word)
+        else:
+            self.deductions = []
+            self.updateKeptRemovedLetters()
         return
 
-    def updateKeptRemovedLetters(self):
-        """ updates self.keptLetters and self.removedLetters """
-        alphabetString = "abcdefghijklmnopqrstuvwxyz"
-        alphabet = Jotto.wordToSet(alphabetString)
-
-        self.removedLetters = set(alphabet)
-        self.keptLetters = set(alphabet)
-        for letter in alphabet:
-            for word in self.words:
-                if letter in word:
-                    self.removedLetters.discard(letter)
-                else: # letter not in word
-                    self.keptLetters.discard(letter)
-        return None
-
-    def trimLetters(self):
-        """ Find letters that are either in or not in all remaining words """
-        self.updateKeptRemovedLetters()
+    def getMatchBitsets(self, guessMask, candidates=None):
+        """ Splits the remaining words by their number of matches with a guess
 
-        for guess, numMatches in self.guesses.items():
-            lettersInGuess = Jotto.wordToSet(guess)
+            The match count of every remaining word is added up one guess letter
+            at a time in a binary counter made of bitsets, so the cost is a few
+            bitwise operations per letter rather than a loop over the words
 
-            # letters than are known to be kept
-            lettersMatching = lettersInGuess.intersection(self.keptLetters)
-            numLettersMatching = len(lettersMatching)
-            
-            # letters than are known to be removed
-            lettersNotMatching = lettersInGuess.intersection(self.removedLetters)
-            numLettersNotMatching = len(lettersNotMatching)
-
-            # if all letters are known to be matching, all other letters should be removed
-            if numLettersMatching == numMatches:
-                # remove remaining letters
-                lettersToRemove = lettersInGuess - lettersMatching
-                self.removeLetters(lettersToRemove)
-
-            if numLettersNotMatching == self.wordLength - numMatches:
-                lettersToKeep = lettersInGuess - lettersNotMatching
-                self.keepLetters(lettersToKeep)
-
-        # for each pair of guess, see if there are differences between the number of matches
-        # that can tell us if there are letters we should remove or keep
-        for guess1, numMatches1 in self.guesses.items():
-            for guess2, numMatches2 in self.guesses.items():
-                # skip guess if guess is itself
-                if guess1 == guess2:
-                    continue
+            Parameters:
+            guessMask (int): letter mask of the guess
+            candidates (int): bitset of words to split instead of the remaining words
+            Returns:
+            (list): bitsets[numMatches] is the bitset of remaining words that
+                    have numMatches letters in common with the guess
+        """
+        if candidates is None:
+            candidates = self.candidates
+        letterBitsets = self.index.letterBitsets
+        counterBits = [] # counterBits[j] has bit i set if bit j of word i's count is set
+        for letter in Jotto.bitsetToPositions(guessMask):
+            carry = letterBitsets[letter] & candidates
+            for j in range(len(counterBits)):
+                counterBits[j], carry = counterBits[j] ^ carry, counterBits[j] & carry
+                if carry == 0:
+                    break
+            if carry:
+                counterBits.append(carry)
 
-                # too many possiblities to deal with equal number of matches
-                if numMatches1 == numMatches2:
+        matchBitsets = []
+        for numMatches in range(self.wordLength + 1):
+            if numMatches >> len(counterBits):
+                matchBitsets.append(0) # more matches than the guess has letters
+                continue
+            matchBitset = candidates
+            for j, bits in enumerate(counterBits):
+                if numMatches >> j & 1:
+                    matchBitset &= bits
+                else:
+                    matchBitset &= ~bits
+            matchBitsets.append(matchBitset)
+        return matchBitsets
+
+    def updateKeptRemovedLetters(self):
+        """ updates self.keptLetters and self.removedLetters
+            Returns:
+            (int): letter mask of the letters whose kept or removed status changed
+        """
+        stats = self.stats
+        if stats is not None:
+            start = time.perf_counter()
+
+        # letters in every remaining word, and letters in no remaining word
+        keptMask = 0
+        removedMask = 0
+        numWords = self.countWords()
+        letterBitsets = self.index.letterBitsets if self.index is not None else [0] * len(Jotto.ALPHABET)
+        for letter, letterBitset in enumerate(letterBitsets):
+            numWordsWithLetter = Jotto.popcount(self.candidates & letterBitset)
+            if numWordsWithLetter == numWords:
+                keptMask |= 1 << letter
+            if numWordsWithLetter == 0:
+                removedMask |= 1 << letter
+
+        changedMask = (keptMask ^ self.keptMask) | (removedMask ^ self.removedMask)
+        self.keptMask = keptMask
+        self.removedMask = removedMask
+        self.keptLetters = Jotto.maskToSet(keptMask)
+        self.removedLetters = Jotto.maskToSet(removedMask)
+        if stats is not None:
+            stats.addTime("updateKeptRemovedLetters", time.perf_counter() - start)
+        return changedMask
+
+    def trimLetters(self, newGuess=None):
+        """ Find letters that are either in or not in all remaining words
+
+            Deductions are made incrementally. The pair constraints between
+            newGuess and every earlier guess are evaluated once, then the single
+            guess constraint of each guess that has a letter whose kept or removed
+            status changed is evaluated again, until nothing changes.
+            Without newGuess every guess is treated as new.
+            The deductions that removed words are recorded in self.deductions
+            Deductions can only remove words that do not have the exact number of
+            matches of a guess, so pickWord only calls this after an at least guess
+
+            Parameters:
+            newGuess (string): the guess that was just added to self.guesses
+            Returns:
+            None
+        """
+        stats = self.stats
+        if stats is not None:
+            start = time.perf_counter()
+
+        self.deductions = []
+        changedMask = self.updateKeptRemovedLetters()
+
+        newGuesses = list(self.guesses) if newGuess is None else [newGuess]
+        pairedGuesses = set()
+        for guess1 in newGuesses:
+            pairedGuesses.add(guess1)
+            for guess2 in self.guesses:
+                # evaluate each pair of guesses once
+                if guess2 in pairedGuesses:
                     continue
+                changedMask |= self.applyPairConstraint(guess1, guess2)
 
-                letters1 = Jotto.wordToSet(guess1)
-                letters2 = Jotto.wordToSet(guess2)
-                lettersIntersection = letters1.intersection(letters2)
-                numIntersecting = len(lettersIntersection)
-                differenceInMatches = numMatches2 - numMatches1
-
-                # difference in matches + number of intersecting == wordLength
-                # means difference is due to discrepancy in letters that should be kept or removed
-                if numIntersecting == self.wordLength - abs(differenceInMatches):
-                    # keep non-intersecting letters in match 2 and remove non-intersecting letters in match 1
-                    lettersToKeep = None
-                    lettersToRemove = None
-                    if numMatches2 > numMatches1:
-                        lettersToKeep = letters2 - lettersIntersection
-                        lettersToRemove = letters1 - lettersIntersection
-                    else: #numMatches1 > numMatches2
-                        lettersToKeep = letters1 - lettersIntersection
-                        lettersToRemove = letters2 - lettersIntersection
-                    self.keepLetters(lettersToKeep)
-                    self.removeLetters(lettersToRemove)       
+        self.propagateDeductions(changedMask, newGuesses)
+        if stats is not None:
+            stats.addTime("trimLetters", time.perf_counter() - start)
         return
-            
+
+    def propagateDeductions(self, changedMask, guesses=()):
+        """ Evaluates single guess constraints until no more letters can be deduced
+
+            Parameters:
+            changedMask (int): letters whose kept or removed status changed,
+                               guesses containing them are evaluated
+            guesses (iterable): guesses to evaluate regardless of changedMask
+            Returns:
+            None
+        """
+        pending = list(guesses)
+        pending.extend(guess for guess in self.guesses if self.getMask(guess) & changedMask)
+        queued = set(pending)
+        while pending:
+            guess = pending.pop(0)
+            queued.discard(guess)
+            changedMask = self.applySingleConstraint(guess)
+            if changedMask == 0:
+                continue
+            for otherGuess in self.guesses:
+                if otherGuess not in queued and self.getMask(otherGuess) & changedMask:
+                    pending.append(otherGuess)
+                    queued.add(otherGuess)
+        return
+
+    def applySingleConstraint(self, guess):
+        """ Deduces letters from the number of matches of one guess
+            Returns:
+            (int): letter mask of the letters whose kept or removed status changed
+        """
+        lettersInGuess = self.getMask(guess)
+        numMatches = self.guesses[guess]
+
+        # letters than are known to be kept
+        lettersMatching = lettersInGuess & self.keptMask
+        # letters than are known to be removed
+        lettersNotMatching = lettersInGuess & self.removedMask
+
+        lettersToKeep = 0
+        lettersToRemove = 0
+        # if all letters are known to be matching, all other letters should be removed
+        if Jotto.popcount(lettersMatching) == numMatches:
+            lettersToRemove = lettersInGuess & ~lettersMatching
+        # if all letters are known to be not matching, all other letters should be kept
+        if Jotto.popcount(lettersNotMatching) == self.wordLength - numMatches:
+            lettersToKeep = lettersInGuess & ~lettersNotMatching
+        return self.applyDeduction((guess,), lettersToKeep, lettersToRemove)
+
+    def applyPairConstraint(self, guess1, guess2):
+        """ Deduces letters from the difference in matches between two guesses
+            Returns:
+            (int): letter mask of the letters whose kept or removed status changed
+        """
+        numMatches1 = self.guesses[guess1]
+        numMatches2 = self.guesses[guess2]
+
+        # too many possiblities to deal with equal number of matches
+        if numMatches1 == numMatches2:
+            return 0
+
+        letters1 = self.getMask(guess1)
+        letters2 = self.getMask(guess2)
+        lettersIntersection = letters1 & letters2
+        numIntersecting = Jotto.popcount(lettersIntersection)
+        differenceInMatches = numMatches2 - numMatches1
+
+        # difference in matches + number of intersecting == wordLength
+        # means difference is due to discrepancy in letters that should be kept or removed
+        if numIntersecting != self.wordLength - abs(differenceInMatches):
+            return 0
+
+        # keep non-intersecting letters of the guess with more matches
+        # and remove non-intersecting letters of the other guess
+        if numMatches2 > numMatches1:
+            lettersToKeep = letters2 & ~lettersIntersection
+            lettersToRemove = letters1 & ~lettersIntersection
+        else: #numMatches1 > numMatches2
+            lettersToKeep = letters1 & ~lettersIntersection
+            lettersToRemove = letters2 & ~lettersIntersection
+        return self.applyDeduction((guess1, guess2), lettersToKeep, lettersToRemove)
+
+    def applyDeduction(self, guesses, keepMask, removeMask):
+        """ Filters the remaining words by a deduction, and records it
+            in self.deductions if it removed any words
+
+            Parameters:
+            guesses (tuple): the guesses the deduction was made from
+            keepMask (int): letters that must be in the jotto word
+            removeMask (int): letters that must not be in the jotto word
+            Returns:
+            (int): letter mask of the letters whose kept or removed status changed
+        """
+        # skip letters that are already known
+        keepMask &= ~self.keptMask
+        removeMask &= ~self.removedMask
+        if keepMask == 0 and removeMask == 0:
+            return 0
+
+        candidates = self.candidates
+        self.filterLetters(keepMask, removeMask)
+        if self.candidates == candidates:
+            return 0
+        lettersKept = "".join(sorted(Jotto.maskToSet(keepMask)))
+        lettersRemoved = "".join(sorted(Jotto.maskToSet(removeMask)))
+        self.deductions.append((guesses, lettersKept, lettersRemoved))
+        if self.stats is not None:
+            self.stats.count("deductionsFired")
+        return self.updateKeptRemovedLetters()
 
     def removeLetters(self, lettersToRemove):
         """ Removes words in self.words that have letters in lettersToRemove
@@ -185,13 +944,23 @@ class Jotto:
             Returns:
             None
         """
-        newWords = set(self.words)
-        for word in self.words:
-            for letter in lettersToRemove:
-                if letter in word:
-                    newWords.discard(word)
-        self.words = set(newWords)
-        self.updateKeptRemovedLetters()
+        self.removeLettersMask(Jotto.wordToMask(lettersToRemove))
+        return
+
+    def removeLettersMask(self, removeMask):
+        """ Removes words in self.words that have any letter in removeMask
+
+            Parameters:
+            removeMask (int): letter mask of the letters to be removed
+
+            Returns:
+            None
+        """
+        self.deductions = []
+        self.filterLetters(0, removeMask)
+        changedMask = self.updateKeptRemovedLetters()
+        if self.inexactGuesses:
+            self.propagateDeductions(changedMask)
         return
 
     def keepLetters(self, lettersToKeep):
@@ -204,13 +973,38 @@ class Jotto:
             Returns:
             None
         """
-        newWords = set(self.words)
-        for word in self.words:
-            for letter in lettersToKeep:
-                if letter not in word:
-                    newWords.discard(word)     
-        self.words = set(newWords)
-        self.updateKeptRemovedLetters()
+        self.keepLettersMask(Jotto.wordToMask(lettersToKeep))
+        return
+
+    def keepLettersMask(self, keepMask):
+        """ Only keeps words in self.words that have every letter in keepMask
+
+            Parameters:
+            keepMask (int): letter mask of the letters to be kept
+
+            Returns:
+            None
+        """
+        self.deductions = []
+        self.filterLetters(keepMask, 0)
+        changedMask = self.updateKeptRemovedLetters()
+        if self.inexactGuesses:
+            self.propagateDeductions(changedMask)
+        return
+
+    def filterLetters(self, keepMask, removeMask):
+        """ Only keeps words in self.words that have every letter in keepMask
+            and no letter in removeMask, without updating the kept and removed letters
+        """
+        if self.stats is not None:
+            numWords = self.countWords()
+        letterBitsets = self.index.letterBitsets
+        for letter in Jotto.bitsetToPositions(keepMask):
+            self.candidates &= letterBitsets[letter]
+        for letter in Jotto.bitsetToPositions(removeMask):
+            self.candidates &= ~letterBitsets[letter]
+        if self.stats is not None:
+            self.stats.count("candidatesFiltered", numWords - self.countWords())
         return
         
             
@@ -219,7 +1013,9 @@ class Jotto:
 
     
     def playGame(self):
-        """ Run this function to play the game """
+        """ Run this function to play the game
+            A command line interface over JottoSession
+        """
         print("Welcome to jotto AI")
         self.getNumberOfLetters()
 
@@ -233,102 +1029,392 @@ class Jotto:
         while (gameOver == False):
             gameOver = self.takeGuess()
             numMoves += 1
-            print("Words left: " + str(len(self.words)))
+            print("Words left: " + str(self.countWords()))
         print("Congratulations. Total moves: " + str(numMoves))
         return
 
-    def calculateGuess(self, scenario):
+    def calculateGuess(self, scenario, exhaustive=False, timeBudget=None, workers=None):
         """ Returns the optimal guess based on a particular scenario
 
         Parameters:
-        scenario (string): the type of scenario to calculate the optimal guess
-                            must be either "worst" or "average"
+        scenario (string): the type of scenario to calculate the optimal guess,
+                            one of "worst", "average", "expected" or "entropy"
+        exhaustive (bool): if True, every word of the guess list of the current length
+                            is tried as a guess, otherwise an evenly spaced sample of
+                            100 of them. The remaining words are always tried
+        timeBudget (float): optional number of seconds to search for. Guesses are
+                            then tried in order of getLetterCoverage, and when the
+                            budget runs out the best guess found so far is returned
+        workers (int): optional number of processes to split the search across
 
         Returns:
         (string): If scenario is "worst", returns the guess that gives the largest elimination
                     of jotto words in the worst case number of matches
-                  If scenario is "average", returns the guess that gives the largest elimination
-                    of jotto words in the average case number of matches
+                  If scenario is "average", returns the guess that leaves the fewest jotto
+                    words on average over the numbers of matches it can get
+                  If scenario is "expected", returns the guess that leaves the fewest
+                    jotto words on average over the remaining words
+                  If scenario is "entropy", returns the guess that gains the most
+                    information about the jotto word
+                  Ties are broken in favor of remaining words, then alphabetically,
+                    or in order of letter coverage if there is a time budget
+        Details of the search are left in self.lastSearch:
+        {"guess": guess, "score": score of the guess for scenario,
+         "probesScored": number of guesses tried, "probesTotal": number of guesses to try,
+         "complete": True if every guess was tried, "cached": True if the result was cached}
+        The probe counts are None for cached results
         """
-        # back up rep invariant
-        self.wordsBackup = set(self.words)
-        self.allWordsBackup = set(self.allWords)
-        self.wordLengthBackup = int(self.wordLength)
-        self.keptLettersBackup = set(self.keptLetters)
-        self.removedLettersBackup = set(self.removedLetters)
-        self.guessesBackup = dict(self.guesses) # [(guess1,numMatches1),...]
+        if scenario not in Jotto.SCENARIOS:
+            raise ValueError('parameter scenario must be one of "worst", "average", "expected" or "entropy"')
+
+        deadline = None
+        if timeBudget is not None:
+            deadline = time.monotonic() + timeBudget
+
+        # a cached result comes from a complete search, so it also serves budgeted searches,
+        # but searches with a time budget are not cached, their result depends on timing
+        cacheKey = None
+        if self.guessCache is not None:
+            cacheKey = self.getStateKey(scenario, exhaustive)
+            cached = self.guessCache.get(cacheKey)
+            if self.stats is not None:
+                self.stats.count("cacheMisses" if cached is None else "cacheHits")
+            if cached is not None:
+                self.lastSearch = {"guess": cached[0], "score": cached[1], "probesScored": None,
+                                   "probesTotal": None, "complete": True, "cached": True}
+                return cached[0]
+            if timeBudget is not None:
+                cacheKey = None
+
+        # guesses come from the guess list, or a sample of it
+        guessWords = self.guessIndex.words
+        guessPositions = [i for i, word in enumerate(guessWords)
+                          if word not in self.guesses and word not in self.unknownWords]
+        if not exhaustive:
+            numGuesses = 100
+            step = max(1, len(guessPositions) // numGuesses)
+            guessPositions = guessPositions[::step][:numGuesses]
+        guessMasksByWord = {guessWords[i]: self.guessIndex.masks[i] for i in guessPositions}
+
+        # the remaining words, which can win outright, are always tried
+        words = self.index.words
+        masks = self.index.masks
+        candidatePositions = self.getCandidatePositions()
+        remainingWords = set()
+        for i in candidatePositions:
+            remainingWords.add(words[i])
+            if words[i] not in self.guesses and words[i] not in self.unknownWords:
+                guessMasksByWord[words[i]] = masks[i]
+
+        # sorted, so the result does not depend on set iteration order
+        guessList = sorted(guessMasksByWord)
+        if deadline is not None:
+            # most promising guesses first, so a search cut short has tried them
+            coverage = self.getLetterCoverage([guessMasksByWord[word] for word in guessList])
+            order = sorted(range(len(guessList)), key=lambda i: -coverage[i])
+            guessList = [guessList[i] for i in order]
+
+        guessMasks = [guessMasksByWord[word] for word in guessList]
+        isRemaining = [word in remainingWords for word in guessList]
+        candidateMasks = [masks[i] for i in candidatePositions]
+        if workers is not None and workers > 1:
+            best, numScored = Jotto.searchGuessesParallel(guessMasks, isRemaining, candidateMasks,
+                                                          self.wordLength, scenario, deadline, workers)
+        else:
+            best, numScored = Jotto.searchGuesses(guessMasks, isRemaining, candidateMasks,
+                                                  self.wordLength, scenario, deadline)
+        if self.stats is not None:
+            self.stats.count("probesScored", numScored)
+        if best is None:
+            self.lastSearch = None
+            return None
+        bestGuess = guessList[best[2]]
+        score = -best[0] if scenario == "entropy" else best[0]
+        self.lastSearch = {"guess": bestGuess, "score": score, "probesScored": numScored,
+                           "probesTotal": len(guessList), "complete": numScored == len(guessList),
+                           "cached": False}
+        if cacheKey is not None:
+            self.guessCache.put(cacheKey, (bestGuess, score))
+        return bestGuess
 
-        
-        numInitialWords = len(self.words)
-        guessesToTry = set()
-        numGuesses = 100
-        for _ in range(numGuesses):
-            guess = self.allWords.pop()
-            if guess in self.guesses: # (word, numMatches)
-                continue
-            else:
-                guessesToTry.add( guess )
-        self.allWords = set(self.allWordsBackup)
+    def lookaheadGuess(self, scenario="expected", depth=3, breadth=6, timeBudget=None):
+        """ Returns the guess that finds the jotto word in the fewest moves,
+            searching several guesses ahead, see LookaheadSearch
 
-        # find word counts for scenario after elimination
-        wordCounts = {} 
-        for word in guessesToTry:
-            
-            workingWordCount = [] # list of word counts after elimination
-            for numMatches in range(0,self.wordLength+1):
-            # restore rep invariant for next trial
-                self.words = set(self.wordsBackup)
-                self.allWords = set(self.allWordsBackup)
-                self.wordLength = int(self.wordLengthBackup)
-                self.keptLetters = set(self.keptLettersBackup)
-                self.removedLetters = set(self.removedLettersBackup)
-                self.guesses = dict(self.guessesBackup) # [(guess1,numMatches1),...]
-                
-                self.pickWord(word, numMatches)
-                numRemainingWords = len(self.words)
-                workingWordCount.append(numRemainingWords)
-                
-            # pick word count based on scenario
-            wordCount = None
-            if scenario == "worst":
-                wordCount = max(workingWordCount)
-            elif scenario == "average":
-                wordCount = int( sum(workingWordCount)/len(workingWordCount) )
-            else:
-                raise ValueError('parameter scenario must be either "worst" or "average"')
+        Parameters:
+        scenario (string): "expected" minimizes the mean number of moves to find
+                            each remaining word, "worst" minimizes the most moves
+        depth (int): number of guesses to search ahead, the number of moves
+                     after that is estimated from the number of words left
+        breadth (int): number of guesses tried after each guess
+        timeBudget (float): optional number of seconds to search for. When the
+                            budget runs out the best guess found so far is returned
 
-            wordCounts[word] = wordCount
+        Returns:
+        (string): the best guess, or None if there are no words left
+        Details of the search are left in self.lastSearch, see calculateGuess.
+        Its score is the mean or worst number of moves to find the remaining words,
+        "nodes" is the number of word pools searched and "depth" the number of
+        guesses searched ahead, less than depth if the time budget ran out
+        """
+        if scenario not in ("expected", "worst"):
+            raise ValueError('parameter scenario must be either "expected" or "worst"')
+        if depth < 1:
+            raise ValueError("depth must be at least 1")
+        pool = self.getCandidatePositions()
+        if len(pool) == 0:
+            self.lastSearch = None
+            return None
+
+        deadline = None
+        if timeBudget is not None:
+            deadline = time.monotonic() + timeBudget
+
+        cacheKey = None
+        if self.guessCache is not None:
+            cacheKey = self.getStateKey("lookahead", scenario, depth, breadth)
+            cached = self.guessCache.get(cacheKey)
+            if self.stats is not None:
+                self.stats.count("cacheMisses" if cached is None else "cacheHits")
+            if cached is not None:
+                self.lastSearch = {"guess": cached[0], "score": cached[1], "probesScored": None,
+                                   "probesTotal": None, "complete": True, "cached": True, "nodes": 0,
+                                   "depth": depth}
+                return cached[0]
+
+        # besides the remaining words, which can win outright, guesses come from
+        # an evenly spaced sample of the guess list, as in calculateGuess.
+        # unknown words are never in the pool, markUnknown discards them
+        words = self.index.words
+        remainingWords = {words[i] for i in pool}
+        guessWords = self.guessIndex.words
+        numProbes = 100
+        step = max(1, len(guessWords) // numProbes)
+        probeWords = [word for word in guessWords[::step][:numProbes]
+                      if word not in self.guesses and word not in remainingWords and word not in self.unknownWords]
+        probeMasks = [self.guessIndex.getMask(word) for word in probeWords]
+        search = LookaheadSearch(self.index, self.wordLength, probeMasks, scenario, breadth, deadline)
+
+        # the root is searched here rather than by search.solve to keep its best guess.
+        # it is searched one guess deeper at a time, so when the time budget runs out
+        # the result of the deepest complete search is returned
+        guesses = search.rankGuesses(pool) if len(pool) > 1 else pool
+        for searchDepth in range(1, depth + 1):
+            search.complete = True
+            depthGuess = None
+            depthCost = math.inf
+            for guess in guesses:
+                # a one guess deep search never runs out of time, it only estimates
+                if searchDepth > 1 and search.isOutOfTime():
+                    break
+                cost = search.getGuessCost(pool, guess, searchDepth, depthCost)
+                if cost < depthCost:
+                    depthGuess, depthCost = guess, cost
+            if not search.complete:
+                break
+            bestGuess, bestCost, bestDepth = depthGuess, depthCost, searchDepth
+
+        if self.stats is not None:
+            self.stats.count("lookaheadNodes", search.numNodes)
+        score = bestCost / len(pool) if scenario == "expected" else bestCost
+        complete = bestDepth == depth
+        bestWord = words[bestGuess] if bestGuess >= 0 else probeWords[~bestGuess]
+        self.lastSearch = {"guess": bestWord, "score": score, "probesScored": len(guesses),
+                           "probesTotal": len(guesses), "complete": complete, "cached": False,
+                           "nodes": search.numNodes, "depth": bestDepth}
+        if cacheKey is not None and complete:
+            self.guessCache.put(cacheKey, (bestWord, score))
+        return bestWord
+
+    def getLetterCoverage(self, guessMasks):
+        """ Returns a cheap estimate of how well each guess splits the remaining words,
+            higher is better: the sum over the letters of a guess of the number of
+            remaining words on the smaller side of the split by that letter
 
-        # best guess has lowest word count for scenario after elimination
-        bestGuess = min(wordCounts, key=wordCounts.get)
+        Parameters:
+        guessMasks (list): letter masks of the guesses
 
-        # restore rep invariant
-        self.words = set(self.wordsBackup)
-        self.allWords = set(self.allWordsBackup)
-        self.wordLength = int(self.wordLengthBackup)
-        self.keptLetters = set(self.keptLettersBackup)
-        self.removedLetters = set(self.removedLettersBackup)
-        self.guesses = dict(self.guessesBackup) # [(guess1,numMatches1),...]
-        return bestGuess
+        Returns:
+        (list): the estimate of each guess
+        """
+        numWords = self.countWords()
+        letterScores = []
+        for letterBitset in self.index.letterBitsets:
+            numWithLetter = Jotto.popcount(self.candidates & letterBitset)
+            letterScores.append(min(numWithLetter, numWords - numWithLetter))
+
+        # sums of letter scores for every 7 bit chunk of a mask,
+        # so a guess costs 4 lookups rather than a loop over its letters
+        tables = []
+        for shift in range(0, len(Jotto.ALPHABET), 7):
+            table = [0] * 128
+            for chunk in range(1, 128):
+                lowBit = (chunk & -chunk).bit_length() - 1
+                letterScore = letterScores[shift + lowBit] if shift + lowBit < len(letterScores) else 0
+                table[chunk] = table[chunk & (chunk - 1)] + letterScore
+            tables.append(table)
+        table0, table1, table2, table3 = tables
+        return [table0[mask & 127] + table1[mask >> 7 & 127] + table2[mask >> 14 & 127] + table3[mask >> 21]
+                for mask in guessMasks]
+
+    def getStateKey(self, *extra):
+        """ Returns a canonical hash of the game state: the word files, word length,
+            remaining words, guesses made and unknown words, plus any extra values given
+        """
+        stateHash = hashlib.sha1()
+        stateHash.update(Jotto.getDictionaryId(self.filename).encode())
+        if self.answersFilename is not None:
+            stateHash.update(Jotto.getDictionaryId(self.answersFilename).encode())
+        stateHash.update(repr((self.wordLength, sorted(self.guesses), sorted(self.unknownWords)) + extra).encode())
+        stateHash.update(self.candidates.to_bytes(self.candidates.bit_length() // 8 + 1, "little"))
+        return stateHash.hexdigest()
+
+    @staticmethod
+    def searchGuesses(guessMasks, isRemaining, candidateMasks, wordLength, scenario, deadline=None):
+        """ Finds the best guess for a scenario among a list of guesses
+
+        Parameters:
+        guessMasks (list): letter masks of the guesses to try
+        isRemaining (list): isRemaining[i] is True if the i-th guess is a remaining word
+        candidateMasks (list): letter masks of the remaining words
+        wordLength (int): length of the words
+        scenario (string): "worst", "average", "expected" or "entropy", see scoreBucketsFor
+        deadline (float): optional time.monotonic() value to stop searching at.
+                            At least one batch of guesses is always scored
+
+        Returns:
+        (tuple): ((score, not remaining, i) of the best guess, lowest first,
+                  or None if there are no guesses, number of guesses scored).
+                 Entropy scores are negated, as higher entropy is better
+        """
+        # each guess splits the remaining words into buckets by number of matches,
+        # the bucket sizes are the word counts left after elimination.
+        # guesses are scored in batches so the deadline can be checked in between
+        batchSize = Jotto.getBatchSize(len(candidateMasks))
+        if deadline is not None:
+            # smaller batches overshoot the deadline by less
+            batchSize = max(1, batchSize // 8)
+        bestKey = None
+        numScored = 0
+        for start in range(0, len(guessMasks), batchSize):
+            stop = start + batchSize
+            bucketMatrix = Jotto.getMatchBucketMatrix(guessMasks[start:stop], candidateMasks, wordLength)
+            wordCounts = Jotto.scoreBucketMatrix(bucketMatrix, scenario)
+            if scenario == "entropy":
+                wordCounts = [-entropy for entropy in wordCounts]
+
+            # best guess has lowest word count for scenario after elimination
+            for i, wordCount in enumerate(wordCounts, start):
+                key = (wordCount, not isRemaining[i], i)
+                if bestKey is None or key < bestKey:
+                    bestKey = key
+            numScored += len(wordCounts)
+
+            if deadline is not None and time.monotonic() >= deadline:
+                break
+        return bestKey, numScored
+
+    @staticmethod
+    def searchGuessesParallel(guessMasks, isRemaining, candidateMasks, wordLength, scenario, deadline, workers):
+        """ Same as searchGuesses, but the guesses are split into shards that are
+            searched by a pool of worker processes. The masks are passed to the
+            workers through shared memory rather than pickled with every shard
+        """
+        numGuesses = len(guessMasks)
+        numCandidates = len(candidateMasks)
+        if numGuesses == 0:
+            return None, 0
+
+        # layout: guess masks, candidate masks (uint32), then one byte per guess for isRemaining
+        maskBytes = 4 * (numGuesses + numCandidates)
+        sharedMemory = shared_memory.SharedMemory(create=True, size=maskBytes + numGuesses)
+        try:
+            sharedMemory.buf[:maskBytes] = array("I", guessMasks + candidateMasks).tobytes()
+            sharedMemory.buf[maskBytes:maskBytes + numGuesses] = bytes(isRemaining)
+
+            executor = Jotto.getExecutor(workers)
+            shardSize = -(-numGuesses // (4 * workers)) # a few shards per worker to balance load
+            futures = []
+            for start in range(0, numGuesses, shardSize):
+                stop = min(start + shardSize, numGuesses)
+                futures.append(executor.submit(_searchGuessShard, sharedMemory.name, numGuesses, numCandidates,
+                                               wordLength, scenario, start, stop, deadline))
+            results = [future.result() for future in futures]
+        finally:
+            sharedMemory.close()
+            sharedMemory.unlink()
+
+        numScored = sum(result[1] for result in results)
+        bests = [result[0] for result in results if result[0] is not None]
+        if len(bests) == 0:
+            return None, numScored
+        return min(bests), numScored
+
+    @staticmethod
+    def getExecutor(workers):
+        """ Returns a process pool with the given number of workers,
+            pools are created once and reused across calls
+        """
+        if workers not in _EXECUTORS:
+            _EXECUTORS[workers] = ProcessPoolExecutor(max_workers=workers)
+        return _EXECUTORS[workers]
             
         
             
             
 
+    def nextGuess(self):
+        """ Returns the solver's next guess, or None if there are no words left
+            Guesses come from self.policy, then the opening book, if they apply.
+            Up to LOOKAHEAD_WORDS remaining words, it searches lookaheadDepth guesses ahead.
+            Otherwise, with a time budget every word is searched for as long as the budget
+            allows, without one remaining words and a sample are searched below 500 remaining words
+            calculateGuess is split across self.workers processes, if set
+            Details of the search, if any, are left in self.lastSearch
+            With self.stats, the time of the move is added to a timer named after
+            the way the guess was found: "policyGuess", "bookGuess", "lookaheadGuess",
+            "calculateGuess" or "firstRemainingWord"
+        """
+        self.lastSearch = None
+        if self.countWords() == 0:
+            return None
+        stats = self.stats
+        if stats is not None:
+            start = time.perf_counter()
+
+        #guess = self.calculateGuess("average")
+        phase = "policyGuess"
+        guess = self.getPolicyGuess()
+        if guess is None:
+            phase = "bookGuess"
+            guess = self.getBookGuess(self.scenario)
+        if guess is None and self.lookaheadDepth > 0 and self.countWords() <= Jotto.LOOKAHEAD_WORDS:
+            phase = "lookaheadGuess"
+            guess = self.lookaheadGuess("expected", self.lookaheadDepth, timeBudget=self.timeBudget)
+        elif guess is None and self.timeBudget is not None:
+            phase = "calculateGuess"
+            guess = self.calculateGuess(self.scenario, exhaustive=True, timeBudget=self.timeBudget,
+                                        workers=self.workers)
+        elif guess is None and self.countWords() < 500:
+            phase = "calculateGuess"
+            guess = self.calculateGuess(self.scenario, workers=self.workers)
+        elif guess is None:
+            # too many words to search, guess the first remaining word
+            phase = "firstRemainingWord"
+            guess = self.index.words[self.getCandidatePositions()[0]]
+
+        if stats is not None:
+            stats.addTime(phase, time.perf_counter() - start)
+        return guess
+
     def takeGuess(self, guess=None):
         """ Takes a guess, returns True if game is over, else returns False """
+        session = JottoSession(self)
         
         if guess==None:
-            try:
-                #guess = self.calculateGuess("average")
-                if len(self.words) < 500:
-                    guess = self.calculateGuess("worst")
-                    #guess = self.words.pop()
-                else:
-                    guess = self.words.pop()
-            except KeyError: # game over
+            guess = session.recommend()["guess"]
+            if guess is None: # game over
                 return True
-            self.words.add(guess)
 
         print("")
         print("Guess the word: " + guess)
@@ -337,7 +1423,7 @@ class Jotto:
             
         if type(numMatches) == list and numMatches[0] == "guess":
             userGuess = numMatches[1]
-            if len(userGuess) == self.wordLength and userGuess in self.allWords:
+            if session.isValidGuess(userGuess):
                 guess = userGuess
                 return self.takeGuess(guess)
             else:
@@ -346,30 +1432,41 @@ class Jotto:
 
         if type(numMatches) == list and numMatches[0] == "remove":
             lettersToRemove = numMatches[1]
-            self.removeLetters(lettersToRemove)
+            try:
+                session.removeLetters(lettersToRemove)
+            except ValueError as e:
+                print("Invalid letters: " + str(e))
+                return self.takeGuess(guess)
             return self.takeGuess()
 
         if type(numMatches) == list and numMatches[0] == "keep":
             lettersToKeep = numMatches[1]
-            self.keepLetters(lettersToKeep)
+            try:
+                session.keepLetters(lettersToKeep)
+            except ValueError as e:
+                print("Invalid letters: " + str(e))
+                return self.takeGuess(guess)
             return self.takeGuess()
 
         if numMatches == "new":
             return self.takeGuess()
+
+        if numMatches == "count":
+            print("Words left: " + str(session.getState()["wordsLeft"]))
+            return self.takeGuess(guess)
         
         if numMatches == "unknown":
-            self.words.discard(guess)
+            try:
+                session.markUnknown(guess)
+            except ValueError as e:
+                print("That did not work: " + str(e))
+                return self.takeGuess(guess)
             return self.takeGuess()
             
         if numMatches == "game over":
             return True
         
-        self.pickWord(guess, numMatches)
-        self.words.discard(guess)
-        if len(self.words) ==0: # game over
-            return True
-        
-        return False
+        return session.submitFeedback(guess, numMatches)["gameOver"]
 
         
                 
@@ -388,7 +1485,7 @@ class Jotto:
             if userInput == "remaining":
                 print("Keep letters: " + str(sorted(list(self.keptLetters))))
                 print("Remove letters: " + str(sorted(list(self.removedLetters))))
-                print("Words left: " + str(len(self.words)))
+                print("Words left: " + str(self.countWords()))
                 return self.getNumberOfMatches()
 
 
@@ -445,14 +1542,8 @@ class Jotto:
         try:
             numLetters = int( input() )
             
-            minLetters = 2
-            maxLetters = 15
-            if minLetters <= numLetters and numLetters <= maxLetters:
-                self.keepWordsOfLength(numLetters)
-                self.wordLength = numLetters
-                return
-            else:
-                raise IOError
+            JottoSession(self).start(numLetters)
+            return
         except (IOError, ValueError) as e:
             print("That did not work. Please enter a number between 2 and 15")
             self.getNumberOfLetters()
@@ -465,6 +1556,128 @@ class Jotto:
             
         
 
+    @staticmethod
+    def getMatchBuckets(guessMask, candidateMasks, wordLength):
+        """ Partitions candidate words by their number of matches with a guess
+            Parameters:
+            guessMask (int): letter mask of the guess
+            candidateMasks (iterable): letter masks of the candidate words
+            wordLength (int): length of the words
+            Returns:
+            (list): buckets[numMatches] is the number of candidates that
+                    have numMatches letters in common with the guess
+        """
+        buckets = [0] * (wordLength + 1)
+        for mask in candidateMasks:
+            buckets[Jotto.countMatches(guessMask, mask)] += 1
+        return buckets
+
+    @staticmethod
+    def scoreBucketsFor(buckets, scenario):
+        """ Scores a guess from the sizes of its match buckets
+            Parameters:
+            buckets (list): bucket sizes, as returned by getMatchBuckets
+            scenario (string): one of
+                     "worst": largest bucket,
+                     "average": mean size of the non-empty buckets, i.e. words left on
+                                average over the numbers of matches the guess can get,
+                     "expected": expected number of words left, each bucket weighted
+                                 by the number of candidate words in it,
+                     "entropy": information in bits gained by the guess
+            Returns:
+            (number): the score of the guess for scenario
+        """
+        if scenario == "worst":
+            return max(buckets)
+        numWords = sum(buckets)
+        if scenario == "average":
+            # buckets are exact, so over every number of matches the mean would always be
+            # numWords/(wordLength + 1), only the numbers of matches that can occur count
+            numBuckets = sum(1 for bucket in buckets if bucket > 0)
+            return numWords / numBuckets if numBuckets > 0 else 0.0
+        if scenario == "expected":
+            return sum(bucket * bucket for bucket in buckets) / numWords if numWords > 0 else 0.0
+        entropy = 0.0
+        for bucket in buckets:
+            if bucket > 0:
+                p = bucket / numWords
+                entropy -= p * math.log2(p)
+        return entropy
+
+    @staticmethod
+    def getBatchSize(numCandidates):
+        """ Returns how many guesses to score at once against numCandidates words,
+            bounding the size of the guess x candidate match matrix
+        """
+        if np is None:
+            return 64
+        maxMatrixSize = 1 << 22
+        return max(1, maxMatrixSize // max(1, numCandidates))
+
+    @staticmethod
+    def getMatchBucketMatrix(guessMasks, candidateMasks, wordLength):
+        """ Partitions candidate words by their number of matches with each guess
+            Uses numpy when it is installed, else getMatchBuckets for each guess
+            Parameters:
+            guessMasks (list): letter masks of the guesses
+            candidateMasks (list): letter masks of the candidate words
+            wordLength (int): length of the words
+            Returns:
+            (list or numpy.ndarray): one row of buckets per guess,
+                                     see getMatchBuckets
+        """
+        if np is None:
+            return [Jotto.getMatchBuckets(guessMask, candidateMasks, wordLength) for guessMask in guessMasks]
+
+        # anagrams share a letter mask, so only distinct masks are compared
+        # and candidates are weighted by how many words share their mask
+        guesses, guessInverse = np.unique(np.asarray(guessMasks, dtype=np.uint32), return_inverse=True)
+        candidates, counts = np.unique(np.asarray(candidateMasks, dtype=np.uint32), return_counts=True)
+        matches = Jotto.popcountArray(guesses[:, None] & candidates[None, :])
+
+        weights = counts.astype(np.float32) # exact for counts below 2**24
+        bucketMatrix = np.empty((len(guesses), wordLength + 1), dtype=np.int64)
+        for numMatches in range(wordLength + 1):
+            bucketMatrix[:, numMatches] = (matches == numMatches) @ weights
+        return bucketMatrix[guessInverse.ravel()]
+
+    @staticmethod
+    def scoreBucketMatrix(bucketMatrix, scenario):
+        """ Scores every row of a bucket matrix, see scoreBucketsFor
+            Parameters:
+            bucketMatrix (list or numpy.ndarray): as returned by getMatchBucketMatrix
+            scenario (string): "worst", "average", "expected" or "entropy"
+            Returns:
+            (list): score of each row
+        """
+        if np is None or not isinstance(bucketMatrix, np.ndarray):
+            return [Jotto.scoreBucketsFor(buckets, scenario) for buckets in bucketMatrix]
+
+        if scenario == "worst":
+            scores = bucketMatrix.max(axis=1)
+        elif scenario == "average":
+            numBuckets = np.maximum((bucketMatrix > 0).sum(axis=1), 1)
+            scores = bucketMatrix.sum(axis=1) / numBuckets
+        elif scenario == "expected":
+            numWords = np.maximum(bucketMatrix.sum(axis=1), 1)
+            scores = (bucketMatrix * bucketMatrix).sum(axis=1) / numWords
+        else: # entropy
+            numWords = np.maximum(bucketMatrix.sum(axis=1, keepdims=True), 1)
+            p = bucketMatrix / numWords
+            with np.errstate(divide="ignore", invalid="ignore"):
+                scores = -np.where(p > 0, p * np.log2(p), 0.0).sum(axis=1)
+        return scores.tolist()
+
+    @staticmethod
+    def popcountArray(masks):
+        """ Returns the number of set bits of every element of a numpy uint32 array """
+        if hasattr(np, "bitwise_count"): # numpy >= 2.0
+            return np.bitwise_count(masks)
+        global _POPCOUNT_TABLE
+        if _POPCOUNT_TABLE is None:
+            _POPCOUNT_TABLE = np.array([bin(i).count("1") for i in range(1 << 16)], dtype=np.uint8)
+        return _POPCOUNT_TABLE[masks & 0xFFFF] + _POPCOUNT_TABLE[masks >> 16]
+
     @staticmethod
     def isCombinationInWord(letterCombination, word):
         """ Returns true if a validjotto letter combination is contained in
@@ -476,9 +1689,8 @@ class Jotto:
             Returns:
             (bool): True if all letters of letterCombination are contained in word
         """
-        letterCombinationSet = set(letterCombination)
-        letterSet = Jotto.wordToSet(word)
-        if letterCombinationSet.issubset(letterSet):
+        combinationMask = Jotto.wordToMask(letterCombination)
+        if combinationMask & Jotto.wordToMask(word) == combinationMask:
             return True
         return False
                   
@@ -544,6 +1756,480 @@ class Jotto:
         for letter in word:
             letterSet.add(letter)
         return letterSet
+
+    @staticmethod
+    def wordToMask(word):
+        """Converts a word to a 26 bit mask of the letters in the word
+            Parameters:
+            word (string): lowercase word, or any iterable of lowercase letters
+            Returns:
+            (int): mask with bit i set if the i-th letter of the alphabet is in word
+        """
+        mask = 0
+        for letter in word:
+            mask |= 1 << (ord(letter) - 97) # ord("a") == 97
+        return mask
+
+    @staticmethod
+    def maskToSet(mask):
+        """Converts a letter mask back to a set of letters
+            Parameters:
+            mask (int): 26 bit letter mask
+            Returns:
+            (set): set of letters in mask
+        """
+        letterSet = set()
+        for i, letter in enumerate(Jotto.ALPHABET):
+            if mask >> i & 1:
+                letterSet.add(letter)
+        return letterSet
+
+    @staticmethod
+    def popcount(mask):
+        """Returns the number of set bits in mask"""
+        return bin(mask).count("1")
+
+    @staticmethod
+    def countMatches(mask1, mask2):
+        """Returns the number of letters two jotto words have in common
+            Parameters:
+            mask1 (int): letter mask of the first word
+            mask2 (int): letter mask of the second word
+            Returns:
+            (int): number of matching letters
+        """
+        return Jotto.popcount(mask1 & mask2)
+
+    @staticmethod
+    def bitsetToPositions(bitset):
+        """Returns the positions of the set bits of a bitset, lowest first"""
+        bits = bin(bitset)[:1:-1] # binary digits, least significant first
+        return [i for i, bit in enumerate(bits) if bit == "1"]
+
+    @staticmethod
+    def positionsToBitset(positions):
+        """Returns a bitset with the bits at the given positions set"""
+        if len(positions) == 0:
+            return 0
+        bitsetBytes = bytearray(max(positions) // 8 + 1)
+        for i in positions:
+            bitsetBytes[i >> 3] |= 1 << (i & 7)
+        return int.from_bytes(bitsetBytes, "little")
+
+
+
+class JottoSession:
+    """ A jotto game driven through method calls, with no input or output
+
+        Every method returns a dict describing the result, so a session can be
+        driven by a program, e.g. a server, as well as by Jotto.playGame.
+        Invalid requests raise ValueError. A session only wraps a Jotto,
+        all of its state is the state of the Jotto
+    """
+    MIN_WORD_LENGTH = 2
+    MAX_WORD_LENGTH = 15
+
+    def __init__(self, game=None, filename=Jotto.DICTIONARY_FILENAME, timeBudget=None, scenario=None, profile=False,
+                 answersFilename=None, policy=None):
+        """ Parameters:
+            game (Jotto): game to drive, a new one using filename and answersFilename if None
+            filename (string): word file
+            timeBudget (float): if given, seconds a recommendation may spend searching,
+                                see Jotto.nextGuess
+            scenario (string): if given, scenario recommendations are searched for,
+                               see Jotto.calculateGuess
+            profile (bool): if True, count and time the work done, see getStats
+            answersFilename (string): optional word file of the words that can be the jotto word
+            policy (dict): optional decision tree to follow, see Jotto.getPolicyGuess
+        """
+        self.game = game if game is not None else Jotto(filename, answersFilename)
+        if timeBudget is not None:
+            self.game.timeBudget = timeBudget
+        if scenario is not None:
+            if scenario not in Jotto.SCENARIOS:
+                raise ValueError("scenario must be one of " + ", ".join(Jotto.SCENARIOS))
+            self.game.scenario = scenario
+        if profile and self.game.stats is None:
+            self.game.stats = JottoStats()
+        if policy is not None:
+            self.game.policy = policy
+
+    def start(self, wordLength):
+        """ Starts a game of words with wordLength letters,
+            forgetting the guesses and unknown words of any previous game
+            Returns:
+            (dict): see getState
+        """
+        if not (JottoSession.MIN_WORD_LENGTH <= wordLength <= JottoSession.MAX_WORD_LENGTH):
+            raise ValueError("word length must be between " + str(JottoSession.MIN_WORD_LENGTH) +
+                             " and " + str(JottoSession.MAX_WORD_LENGTH))
+        self.game.guesses = {}
+        self.game.unknownWords = set()
+        self.game.inexactGuesses = False
+        self.game.deductions = []
+        self.game.lastSearch = None
+        self.game.keepWordsOfLength(wordLength)
+        self.game.wordLength = wordLength
+        self.game.updateKeptRemovedLetters()
+        return self.getState()
+
+    def recommend(self):
+        """ Returns the solver's next guess
+            Returns:
+            (dict): {"guess": guess, or None if no words are left,
+                     "wordsLeft": number of remaining words,
+                     "gameOver": True if no words are left,
+                     "search": details of the search for guess, None if there was
+                               no search, see Jotto.calculateGuess}
+        """
+        self.checkStarted()
+        guess = self.game.nextGuess()
+        return {"guess": guess, "wordsLeft": self.game.countWords(), "gameOver": guess is None,
+                "search": self.game.lastSearch}
+
+    def submitFeedback(self, guess, numMatches):
+        """ Applies the number of letters the jotto word has in common with guess
+            Returns:
+            (dict): see getState
+        """
+        self.checkStarted()
+        if not self.isValidGuess(guess):
+            raise ValueError("guess must be a jotto word of " + str(self.game.wordLength) + " letters")
+        if type(numMatches) != int or not (0 <= numMatches <= self.game.wordLength):
+            raise ValueError("number of matches must be between 0 and " + str(self.game.wordLength))
+        self.game.pickWord(guess, numMatches)
+        self.game.discardWord(guess)
+        return self.getState()
+
+    def keepLetters(self, letters):
+        """ Only keeps words that have every letter in letters
+            Returns:
+            (dict): see getState
+        """
+        self.checkStarted()
+        self.game.keepLetters(self.checkLetters(letters))
+        return self.getState()
+
+    def removeLetters(self, letters):
+        """ Removes words that have any letter in letters
+            Returns:
+            (dict): see getState
+        """
+        self.checkStarted()
+        self.game.removeLetters(self.checkLetters(letters))
+        return self.getState()
+
+    def markUnknown(self, word):
+        """ Removes a word the other player does not know from the remaining words,
+            it is not recommended again
+            Returns:
+            (dict): see getState
+        """
+        self.checkStarted()
+        if not self.isValidGuess(word):
+            raise ValueError("unknown word must be a jotto word of " + str(self.game.wordLength) + " letters")
+        self.game.markUnknown(word)
+        return self.getState()
+
+    def isValidGuess(self, guess):
+        """ Returns True if guess is a word of the game's length that can be guessed """
+        return self.game.wordLength is not None and len(guess) == self.game.wordLength and self.game.isGuessable(guess)
+
+    def getState(self):
+        """ Returns:
+            (dict): {"wordLength": word length,
+                     "wordsLeft": number of remaining words,
+                     "guesses": {guess: numMatches,...},
+                     "keptLetters": letters in every remaining word,
+                     "removedLetters": letters in no remaining word,
+                     "gameOver": True if no words are left}
+        """
+        wordsLeft = self.game.countWords()
+        return {
+            "wordLength": self.game.wordLength,
+            "wordsLeft": wordsLeft,
+            "guesses": dict(self.game.guesses),
+            "keptLetters": "".join(sorted(self.game.keptLetters)),
+            "removedLetters": "".join(sorted(self.game.removedLetters)),
+            "gameOver": self.game.wordLength is not None and wordsLeft == 0,
+        }
+
+    def getStats(self):
+        """ Returns the counters and timers of the session, see JottoStats.getStats,
+            or None if the session is not profiled
+        """
+        if self.game.stats is None:
+            return None
+        return self.game.stats.getStats()
+
+    def getSnapshot(self):
+        """ Returns a small picklable copy of the game state, see fromSnapshot """
+        return (self.game.filename, self.game.wordLength, self.game.candidates, dict(self.game.guesses),
+                self.game.timeBudget, self.game.scenario, self.game.stats is not None, self.game.answersFilename,
+                frozenset(self.game.unknownWords))
+
+    @staticmethod
+    def fromSnapshot(snapshot):
+        """ Returns a new session in the state of a snapshot from getSnapshot,
+            e.g. to compute a recommendation in another process
+        """
+        (filename, wordLength, candidates, guesses, timeBudget, scenario, profile, answersFilename,
+         unknownWords) = snapshot
+        session = JottoSession(filename=filename, timeBudget=timeBudget, scenario=scenario, profile=profile,
+                               answersFilename=answersFilename)
+        session.start(wordLength)
+        session.game.candidates = candidates
+        session.game.guesses = dict(guesses)
+        session.game.unknownWords = set(unknownWords)
+        session.game.updateKeptRemovedLetters()
+        if profile: # only count the work done from the snapshot on
+            session.game.stats.clear()
+        return session
+
+    def checkStarted(self):
+        if self.game.wordLength is None:
+            raise ValueError("game has not been started")
+
+    @staticmethod
+    def checkLetters(letters):
+        if any(letter not in Jotto.ALPHABET for letter in letters):
+            raise ValueError("letters must be lowercase a-z")
+        return letters
+
+
+
+class WordIndex:
+    """ Read only list of jotto words with precomputed letter masks
+
+        Indexes are shared by every game that uses the same dictionary,
+        games only keep a bitset of positions in the index
+
+        words (tuple): sorted words
+        masks (memoryview): masks[i] is the 26 bit letter mask of words[i]
+        positions (dict): {word: i,...}, index back from word to position
+        letterBitsets (tuple): bitset of the words containing each letter
+
+        An index read from the binary dictionary cache keeps its masks in the
+        mapped file and only decodes its words when they are first used
+    """
+    def __init__(self, words):
+        self._words = tuple(sorted(words))
+        self._wordBytes = None
+        self._positions = None
+        self._letterBitsets = None
+        self.wordLength = len(self._words[0]) if self._words else None
+        # a read only view, like the masks of an index read from the cache
+        self.masks = memoryview(array("I", [Jotto.wordToMask(word) for word in self._words]).tobytes()).cast("I")
+
+    @staticmethod
+    def fromBuffer(wordLength, wordBytes, masks):
+        """ Returns a WordIndex over buffers of the binary dictionary cache
+            Parameters:
+            wordLength (int): length of every word
+            wordBytes (memoryview): the sorted words as fixed width ascii
+            masks (memoryview): uint32 letter masks of the words
+            Returns:
+            (WordIndex)
+        """
+        index = WordIndex([])
+        index._words = None
+        index._wordBytes = wordBytes
+        index.wordLength = wordLength
+        index.masks = masks
+        return index
+
+    @property
+    def words(self):
+        if self._words is None:
+            text = bytes(self._wordBytes).decode("ascii")
+            wordLength = self.wordLength
+            self._words = tuple(text[i:i + wordLength] for i in range(0, len(text), wordLength))
+        return self._words
+
+    @property
+    def positions(self):
+        if self._positions is None:
+            self._positions = {word: i for i, word in enumerate(self.words)}
+        return self._positions
+
+    @property
+    def letterBitsets(self):
+        """ letterBitsets[j] has bit i set if words[i] contains the j-th letter of the alphabet """
+        if self._letterBitsets is None:
+            letterBytes = [bytearray(len(self) // 8 + 1) for _ in Jotto.ALPHABET]
+            for i, mask in enumerate(self.masks):
+                for letter in Jotto.bitsetToPositions(mask):
+                    letterBytes[letter][i >> 3] |= 1 << (i & 7)
+            self._letterBitsets = tuple(int.from_bytes(bitsetBytes, "little") for bitsetBytes in letterBytes)
+        return self._letterBitsets
+
+    def __len__(self):
+        return len(self.masks)
+
+    def __iter__(self):
+        return iter(self.words)
+
+    def __contains__(self, word):
+        return word in self.positions
+
+    def getMask(self, word):
+        """ Returns the letter mask of word, computing it if word is not in the index """
+        i = self.positions.get(word)
+        if i is None:
+            return Jotto.wordToMask(word)
+        return self.masks[i]
+
+
+
+class LookaheadSearch:
+    """ Searches several guesses ahead for the guess that finds the jotto word
+        in the fewest moves, see Jotto.lookaheadGuess
+
+        Pools of remaining words are lists of positions in a WordIndex.
+        A guess is either a word of the pool, by its position, or one of
+        the probe words, by the complement ~k of its position k in probeMasks.
+        The cost of a pool is the total number of moves to find each of its
+        words for the "expected" scenario, or the most moves any of its words
+        takes for the "worst" scenario. At each pool only the breadth best
+        guesses by a one move score are tried, best first, and a guess is
+        abandoned as soon as a lower bound of its cost reaches the cost of the
+        best guess so far. Pools searched to the same depth share their cost
+    """
+    def __init__(self, index, wordLength, probeMasks, scenario, breadth, deadline=None):
+        """ Parameters:
+            index (WordIndex): words of the pools
+            wordLength (int): length of the words
+            probeMasks (list): letter masks of words tried as guesses besides the words of a pool
+            scenario (string): "expected" or "worst"
+            breadth (int): number of guesses tried at each pool
+            deadline (float): optional time.monotonic() value to stop searching at,
+                              pools not searched by then get an estimated cost
+        """
+        self.masks = index.masks
+        self.wordLength = wordLength
+        self.probeMasks = probeMasks
+        self.scenario = scenario
+        self.breadth = breadth
+        self.deadline = deadline
+        self.memo = {} # {(pool bitset, depth): (cost, exact),...}, inexact costs are lower bounds
+        self.numNodes = 0 # pools searched
+        self.complete = True # False once the deadline cut the search short
+
+    def getLowerBound(self, numWords):
+        """ Returns a lower bound of the cost of a pool of numWords words,
+            exact for pools of up to 2 words
+        """
+        if self.scenario == "worst":
+            return min(numWords, 2)
+        # at best the first guess is a word of the pool and tells every other word apart
+        return max(0, 2 * numWords - 1)
+
+    def getEstimate(self, pool):
+        """ Returns a rough cost of a pool that is not searched, assuming each guess
+            splits the pool evenly by number of matches. Anagrams can not be told
+            apart by matches, so the words of a group of anagrams are guessed in turn
+        """
+        numWords = len(pool)
+        if numWords <= 2:
+            return self.getLowerBound(numWords)
+        masks = self.masks
+        groupSizes = {}
+        for i in pool:
+            groupSizes[masks[i]] = groupSizes.get(masks[i], 0) + 1
+        moves = math.log(len(groupSizes)) / math.log(self.wordLength + 1)
+        if self.scenario == "worst":
+            return max(self.getLowerBound(numWords), math.ceil(moves) + max(groupSizes.values()))
+        estimate = sum(size * moves + size * (size + 1) / 2 for size in groupSizes.values())
+        return max(self.getLowerBound(numWords), estimate)
+
+    def isOutOfTime(self):
+        if self.deadline is not None and time.monotonic() >= self.deadline:
+            self.complete = False
+            return True
+        return False
+
+    def getMask(self, guess):
+        """ Returns the letter mask of a guess """
+        return self.masks[guess] if guess >= 0 else self.probeMasks[~guess]
+
+    def rankGuesses(self, pool):
+        """ Returns the breadth best guesses for pool by their expected number
+            of words left, best first. Guesses that do not split pool are left out
+        """
+        masks = self.masks
+        probes = pool + [~k for k in range(len(self.probeMasks))]
+        poolMasks = [masks[i] for i in pool]
+        bucketMatrix = Jotto.getMatchBucketMatrix(poolMasks + self.probeMasks, poolMasks, self.wordLength)
+        worstCounts = Jotto.scoreBucketMatrix(bucketMatrix, "worst")
+        expectedCounts = Jotto.scoreBucketMatrix(bucketMatrix, "expected")
+
+        ranked = []
+        for expectedCount, notInPool, i in sorted((expectedCounts[i], i >= len(pool), i) for i in range(len(probes))):
+            if notInPool and worstCounts[i] == len(pool):
+                continue
+            ranked.append(probes[i])
+            if len(ranked) == self.breadth:
+                break
+        return ranked
+
+    def solve(self, pool, depth, bound=math.inf):
+        """ Returns the cost of pool when searching depth guesses ahead.
+            A cost of at least bound may only be a lower bound of the cost
+        """
+        numWords = len(pool)
+        if numWords <= 2:
+            return self.getLowerBound(numWords)
+        if depth == 0 or self.isOutOfTime():
+            return self.getEstimate(pool)
+
+        key = (Jotto.positionsToBitset(pool), depth)
+        memoized = self.memo.get(key)
+        if memoized is not None:
+            cost, exact = memoized
+            if exact or cost >= bound:
+                return cost
+
+        self.numNodes += 1
+        lowerBound = self.getLowerBound(numWords)
+        best = math.inf
+        for guess in self.rankGuesses(pool):
+            cost = self.getGuessCost(pool, guess, depth, min(best, bound))
+            if cost < best:
+                best = cost
+                if best <= lowerBound:
+                    break
+        self.memo[key] = (best, best < bound)
+        return best
+
+    def getGuessCost(self, pool, guess, depth, bound=math.inf):
+        """ Returns the cost of pool when guessing guess first, then searching depth - 1
+            guesses ahead. A cost of at least bound may only be a lower bound of the cost
+        """
+        masks = self.masks
+        guessMask = self.getMask(guess)
+        buckets = [[] for _ in range(self.wordLength + 1)]
+        for i in pool:
+            if i != guess:
+                buckets[Jotto.countMatches(guessMask, masks[i])].append(i)
+        # the largest pools decide the cost, search them first
+        buckets = sorted((bucket for bucket in buckets if bucket), key=len, reverse=True)
+
+        if self.scenario == "worst":
+            cost = 1
+            for bucket in buckets:
+                cost = max(cost, 1 + self.solve(bucket, depth - 1, bound - 1))
+                if cost >= bound:
+                    break
+            return cost
+
+        # every word of the pool takes this guess, then the moves of its bucket
+        cost = len(pool) + sum(self.getLowerBound(len(bucket)) for bucket in buckets)
+        for bucket in buckets:
+            if cost >= bound:
+                break
+            lowerBound = self.getLowerBound(len(bucket))
+            cost += self.solve(bucket, depth - 1, bound - cost + lowerBound) - lowerBound
+        return cost
         
         
         
@@ -552,8 +2238,325 @@ class Jotto:
 
 
 
+def _searchGuessShard(sharedName, numGuesses, numCandidates, wordLength, scenario, start, stop, deadline):
+    """ Worker process side of Jotto.searchGuessesParallel
+        Searches guesses start:stop of the shared memory block sharedName
+        Returns:
+        (tuple): (best (score, not remaining, i) with i indexing all guesses,
+                  or None if the deadline passed before the shard started, number of guesses scored)
+    """
+    if start > 0 and deadline is not None and time.monotonic() >= deadline:
+        return None, 0
+
+    try:
+        sharedMemory = shared_memory.SharedMemory(name=sharedName, track=False)
+    except TypeError: # python < 3.13 has no track parameter
+        sharedMemory = shared_memory.SharedMemory(name=sharedName)
+    try:
+        maskBytes = 4 * (numGuesses + numCandidates)
+        with sharedMemory.buf[:maskBytes] as maskBuffer, maskBuffer.cast("I") as masks:
+            guessMasks = masks[start:stop].tolist()
+            candidateMasks = masks[numGuesses:].tolist()
+        isRemaining = bytes(sharedMemory.buf[maskBytes + start:maskBytes + stop])
+    finally:
+        sharedMemory.close()
+
+    best, numScored = Jotto.searchGuesses(guessMasks, isRemaining, candidateMasks, wordLength, scenario, deadline)
+    if best is None:
+        return None, numScored
+    score, notRemaining, i = best
+    return (score, notRemaining, i + start), numScored
+
+
+
+def _getLatencyPercentiles(latencies):
+    """ Returns the p50, p90, p99 and max of latencies in seconds, in milliseconds,
+        each None if there are no latencies
+    """
+    latencies = sorted(latencies)
+    def percentile(p):
+        if not latencies:
+            return None
+        return 1000 * latencies[min(len(latencies) - 1, int(p / 100 * len(latencies)))]
+    return {"p50": percentile(50), "p90": percentile(90), "p99": percentile(99),
+            "max": 1000 * latencies[-1] if latencies else None}
+
+
+def simulateGames(wordLength, secrets=None, sampleSize=None, seed=0, workers=1, filename=Jotto.DICTIONARY_FILENAME,
+                  timeBudget=None, scenario=None, profile=False, answersFilename=None, policy=None):
+    """ Plays the solver against secret words without any input or output
+
+        Parameters:
+        wordLength (int): length of the secret words
+        secrets (list): secret words to play against, defaults to every
+                        jotto word of wordLength that can be the jotto word
+        sampleSize (int): if given, play against a random sample of this many secrets
+        seed (int): seed of the random sample
+        workers (int): number of processes to play the games across
+        filename (string): word file
+        timeBudget (float): seconds the solver may search per move, see Jotto.nextGuess
+        scenario (string): scenario the solver searches for, see Jotto.calculateGuess
+        profile (bool): if True, include the counters and timers of every game
+                        added together, see JottoStats
+        answersFilename (string): optional word file of the words that can be the jotto word
+        policy (dict): optional decision tree the solver follows, see analyzeGames
+        Returns:
+        (dict): results that can be written as json, with the number of moves
+                of every game, the distribution of moves, the worst games,
+                per move latency percentiles in milliseconds, throughput and
+                peak memory
+    """
+    if secrets is None:
+        J = Jotto(filename, answersFilename)
+        J.keepWordsOfLength(wordLength)
+        secrets = list(J.allWords)
+    if sampleSize is not None and sampleSize < len(secrets):
+        secrets = random.Random(seed).sample(secrets, sampleSize)
+
+    start = time.perf_counter()
+    if workers > 1 and len(secrets) > 1:
+        executor = Jotto.getExecutor(workers)
+        shardSize = -(-len(secrets) // (4 * workers))
+        shards = [secrets[i:i + shardSize] for i in range(0, len(secrets), shardSize)]
+        games = []
+        for shardGames in executor.map(_simulateGameShard, [filename] * len(shards),
+                                       [wordLength] * len(shards), shards, [timeBudget] * len(shards),
+                                       [scenario] * len(shards), [profile] * len(shards),
+                                       [answersFilename] * len(shards), [policy] * len(shards)):
+            games.extend(shardGames)
+    else:
+        games = _simulateGameShard(filename, wordLength, secrets, timeBudget, scenario, profile, answersFilename,
+                                   policy)
+    elapsed = time.perf_counter() - start
+
+    latencies = [latency for game in games for latency in game["latencies"]]
+    movesPerGame = [game["moves"] for game in games]
+    distribution = {}
+    for moves in movesPerGame:
+        distribution[moves] = distribution.get(moves, 0) + 1
+    maxMoves = max(movesPerGame) if movesPerGame else 0
+
+    peakMemory = None
+    if resource is not None: # kilobytes on linux
+        peakMemory = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                         resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+
+    stats = None
+    if profile:
+        stats = JottoStats()
+        for game in games:
+            stats.merge(game["stats"])
+        stats = stats.getStats()
+
+    return {
+        "wordLength": wordLength,
+        "games": len(games),
+        "solved": sum(game["solved"] for game in games),
+        "meanMoves": sum(movesPerGame) / len(games) if games else None,
+        "maxMoves": maxMoves,
+        "worstSecrets": sorted(game["secret"] for game in games if game["moves"] == maxMoves),
+        "movesDistribution": {str(moves): count for moves, count in sorted(distribution.items())},
+        "latencyMs": _getLatencyPercentiles(latencies),
+        "seconds": elapsed,
+        "gamesPerSecond": len(games) / elapsed if elapsed > 0 else None,
+        "movesPerSecond": len(latencies) / elapsed if elapsed > 0 else None,
+        "peakMemoryKb": peakMemory,
+        "workers": workers,
+        "timeBudget": timeBudget,
+        "scenario": scenario if scenario is not None else "worst",
+        "stats": stats,
+        "movesPerGame": {game["secret"]: game["moves"] for game in games},
+    }
+
+
+def _simulateGameShard(filename, wordLength, secrets, timeBudget=None, scenario=None, profile=False,
+                       answersFilename=None, policy=None, maxMoves=50):
+    """ Plays one game against each secret, see simulateGames
+        Returns:
+        (list): [{"secret": secret, "moves": moves, "solved": solved, "latencies": [seconds,...],
+                  "stats": stats of the game, or None if not profiled},...]
+    """
+    games = []
+    for secret in secrets:
+        session = JottoSession(filename=filename, timeBudget=timeBudget, scenario=scenario, profile=profile,
+                               answersFilename=answersFilename, policy=policy)
+        session.start(wordLength)
+        secretMask = Jotto.wordToMask(secret)
+        latencies = []
+        solved = False
+        while len(latencies) < maxMoves:
+            start = time.perf_counter()
+            guess = session.recommend()["guess"]
+            latencies.append(time.perf_counter() - start)
+            if guess is None or guess == secret:
+                solved = guess == secret
+                break
+            session.submitFeedback(guess, Jotto.countMatches(Jotto.wordToMask(guess), secretMask))
+        games.append({"secret": secret, "moves": len(latencies), "solved": solved, "latencies": latencies,
+                      "stats": session.getStats()})
+    return games
+
+
+
+def analyzeGames(wordLength, filename=Jotto.DICTIONARY_FILENAME, answersFilename=None, timeBudget=None,
+                 scenario=None, maxMoves=50):
+    """ Builds the solver's full decision tree for a word length: the guess it
+        makes in every game state reachable against any secret word
+
+        Game states reached by more than one sequence of guesses are only
+        analyzed once, unless maxMoves cut their analysis short, or would cut
+        it short when reached after more guesses
+
+        Parameters:
+        wordLength (int): length of the secret words
+        filename (string): word file
+        answersFilename (string): optional word file of the words that can be the jotto word
+        timeBudget (float): seconds the solver may search per move, see Jotto.nextGuess
+        scenario (string): scenario the solver searches for, see Jotto.calculateGuess
+        maxMoves (int): moves after which a secret counts as unsolved
+        Returns:
+        (dict): results that can be written as json, with the most moves any
+                secret takes, the secrets that take them, the number of game
+                states, per state recommendation latency percentiles in
+                milliseconds, and under "policy" the decision tree, see
+                Jotto.getPolicyGuess, which can be written to a file and replayed
+    """
+    session = JottoSession(filename=filename, timeBudget=timeBudget, scenario=scenario,
+                           answersFilename=answersFilename)
+    session.start(wordLength)
+    memo = {} # {state key: (node, summary, moves),...}
+    latencies = []
+    start = time.perf_counter()
+    tree, summary = _analyzeState(session, 1, maxMoves, memo, latencies)
+    elapsed = time.perf_counter() - start
+
+    policy = {"source": Jotto.getDictionaryId(filename), "wordLength": wordLength, "tree": tree}
+    if answersFilename is not None:
+        policy["answers"] = Jotto.getDictionaryId(answersFilename)
+    return {
+        "wordLength": wordLength,
+        "secrets": summary["secrets"],
+        "nodes": len(memo),
+        "maxMoves": summary["maxMoves"],
+        "worstSecrets": sorted(summary["worstSecrets"]),
+        "meanMoves": summary["totalMoves"] / summary["secrets"] if summary["secrets"] else None,
+        "unsolved": sorted(summary["unsolved"]),
+        "latencyMs": _getLatencyPercentiles(latencies),
+        "seconds": elapsed,
+        "policy": policy,
+    }
+
+
+def _analyzeState(session, moves, maxMoves, memo, latencies):
+    """ Builds the decision tree of a game state, see analyzeGames
+        Parameters:
+        session (JottoSession): session in the game state, the move-th guess is next
+        Returns:
+        (tuple): (node, summary) where node is {"guess": guess, "words": number of remaining
+                 words, "next": {numMatches: node,...}} and summary counts moves from
+                 this state: {"secrets", "maxMoves", "worstSecrets", "totalMoves", "unsolved"}
+    """
+    game = session.game
+    key = game.getStateKey("analyze")
+    if key in memo:
+        # which secrets are unsolved depends on the moves left, so a state analyzed
+        # at another move is only reused if every secret was solved within maxMoves
+        node, summary, memoMoves = memo[key]
+        if memoMoves == moves or (not summary["unsolved"] and moves - 1 + summary["maxMoves"] <= maxMoves):
+            return node, summary
+
+    start = time.perf_counter()
+    guess = session.recommend()["guess"]
+    latencies.append(time.perf_counter() - start)
+
+    words = game.index.words
+    secrets = [words[i] for i in game.getCandidatePositions()]
+    node = {"guess": guess, "words": len(secrets), "next": {}}
+    summary = {"secrets": len(secrets), "maxMoves": 0, "worstSecrets": [], "totalMoves": 0, "unsolved": []}
+    if guess in secrets:
+        summary.update(maxMoves=1, worstSecrets=[guess], totalMoves=1)
+
+    # the other secrets, split by their number of matches with the guess
+    buckets = {}
+    guessMask = game.getMask(guess)
+    for secret in secrets:
+        if secret != guess:
+            numMatches = Jotto.countMatches(guessMask, game.getMask(secret))
+            buckets.setdefault(numMatches, []).append(secret)
+
+    snapshot = session.getSnapshot()
+    for numMatches, bucket in sorted(buckets.items()):
+        if moves >= maxMoves:
+            summary["unsolved"].extend(bucket)
+            continue
+        child = JottoSession.fromSnapshot(snapshot)
+        child.submitFeedback(guess, numMatches)
+        childNode, childSummary = _analyzeState(child, moves + 1, maxMoves, memo, latencies)
+        node["next"][str(numMatches)] = childNode
+
+        childMoves = 1 + childSummary["maxMoves"]
+        if childMoves > summary["maxMoves"]:
+            summary["maxMoves"] = childMoves
+            summary["worstSecrets"] = list(childSummary["worstSecrets"])
+        elif childMoves == summary["maxMoves"]:
+            summary["worstSecrets"].extend(childSummary["worstSecrets"])
+        summary["totalMoves"] += childSummary["totalMoves"] + childSummary["secrets"]
+        summary["unsolved"].extend(childSummary["unsolved"])
+
+    memo[key] = (node, summary, moves)
+    return node, summary
+
+
+
 def main():
-    J = Jotto()
+    parser = argparse.ArgumentParser(description="Fun little ai to help pick words for the game jotto")
+    parser.add_argument("--build-book", action="store_true",
+                        help="compute the opening book of scrabble_words.txt and exit")
+    parser.add_argument("--simulate", type=int, metavar="LENGTH",
+                        help="play the solver against every secret word of LENGTH letters and print json results")
+    parser.add_argument("--sample", type=int, help="with --simulate, only play against a random sample of secrets")
+    parser.add_argument("--seed", type=int, default=0, help="with --sample, seed of the random sample")
+    parser.add_argument("--workers", type=int, default=1, help="number of processes playing the games with --simulate, else searching each move")
+    parser.add_argument("--all-games", action="store_true", help="with --simulate, include the moves of every game")
+    parser.add_argument("--time-budget", type=float, metavar="SECONDS",
+                        help="seconds the solver may search per move, instead of searching fully below 500 words")
+    parser.add_argument("--scenario", choices=Jotto.SCENARIOS, default="worst",
+                        help="scenario the solver, or --build-book, searches for one guess ahead")
+    parser.add_argument("--profile", action="store_true", help="with --simulate, include counters and timers")
+    parser.add_argument("--answers", metavar="FILE",
+                        help="word file of the words that can be the jotto word, any word can be guessed")
+    parser.add_argument("--analyze", type=int, metavar="LENGTH",
+                        help="build the solver's decision tree for LENGTH letters and print json results")
+    parser.add_argument("--export", metavar="FILE", help="with --analyze, write the decision tree to FILE")
+    parser.add_argument("--policy", metavar="FILE", help="follow a decision tree written by --analyze --export")
+    args = parser.parse_args()
+    policy = Jotto.readPolicy(args.policy) if args.policy is not None else None
+
+    if args.build_book:
+        print("Wrote " + Jotto.buildOpeningBook(scenario=args.scenario, answersFilename=args.answers))
+        return
+    if args.simulate is not None:
+        results = simulateGames(args.simulate, sampleSize=args.sample, seed=args.seed, workers=args.workers,
+                                timeBudget=args.time_budget, scenario=args.scenario, profile=args.profile,
+                                answersFilename=args.answers, policy=policy)
+        if not args.all_games:
+            del results["movesPerGame"]
+        print(json.dumps(results, indent=1))
+        return
+    if args.analyze is not None:
+        results = analyzeGames(args.analyze, answersFilename=args.answers, timeBudget=args.time_budget,
+                               scenario=args.scenario)
+        policy = results.pop("policy")
+        if args.export is not None:
+            with open(args.export, "w") as fileHandle:
+                json.dump(policy, fileHandle)
+        print(json.dumps(results, indent=1))
+        return
+    J = Jotto(answersFilename=args.answers)
+    J.timeBudget = args.time_budget
+    J.workers = args.workers
+    J.scenario = args.scenario
+    J.policy = policy
     J.playGame()
                   
     
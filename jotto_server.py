@@ -0,0 +1,249 @@
+"""
+Serves many jotto games from one process
+Clients send one json request per line and get one json response per line
+
+Requests:
+{"op": "new", "wordLength": 5}                        -> {"ok": true, "game": id, "state": {...}}
+{"op": "recommend", "game": id}                       -> {"ok": true, "guess": guess, ...}
+{"op": "feedback", "game": id, "guess": g, "matches": n}
+{"op": "keep", "game": id, "letters": "ab"}
+{"op": "remove", "game": id, "letters": "xz"}
+{"op": "unknown", "game": id, "word": w}
+{"op": "state", "game": id}
+{"op": "stats", "game": id}                           -> {"ok": true, "stats": {...}}, see JottoStats
+{"op": "stats"}                                       -> the stats of every open game added together
+{"op": "close", "game": id}
+Games belong to the connection that created them and are closed when it closes.
+Any "id" in a request is echoed back in its response.
+Failed requests get {"ok": false, "error": message}
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from jotto import Jotto, JottoSession, JottoStats
+
+
+
+
+
+class JottoServer:
+    """ Hosts jotto sessions for asyncio clients
+
+        Recommendations are computed in a process pool so the event loop never
+        blocks on a guess search, and concurrent recommendations for the same
+        game state share one computation
+    """
+    def __init__(self, filename=Jotto.DICTIONARY_FILENAME, workers=None, executor=None, timeBudget=None,
+                 scenario=None, profile=False, answersFilename=None):
+        self.filename = filename
+        self.answersFilename = answersFilename # optional word file of the words that can be the jotto word
+        self.timeBudget = timeBudget # seconds a recommendation may search, see Jotto.nextGuess
+        self.scenario = scenario # scenario recommendations are searched for, see Jotto.calculateGuess
+        self.profile = profile # if True, sessions count and time their work, see JottoStats
+        if executor is None:
+            # forked workers would inherit the sockets of connected clients,
+            # keeping connections open after the clients close them
+            executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+        self.executor = executor
+        self.sessions = {} # {gameId: JottoSession,...}
+        self.pending = {} # {state key: future of the recommended guess,...}
+        self.nextGameId = 1
+        self.numRecommendations = 0 # recommendations computed, not counting coalesced requests
+
+    async def start(self, host="127.0.0.1", port=8765):
+        """ Starts listening, returns the asyncio server """
+        # load the shared dictionary up front rather than on the first request
+        Jotto(self.filename, self.answersFilename)
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self.executor, _loadDictionary, self.filename, self.answersFilename)
+        return await asyncio.start_server(self.handleClient, host, port)
+
+    async def handleClient(self, reader, writer):
+        """ Answers the requests of one connection, in order,
+            then closes the games it created
+        """
+        gameIds = set() # games created by this connection
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                response = await self.handleRequest(line, gameIds)
+                writer.write(json.dumps(response).encode() + b"\n")
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            # abandoned or crashed clients would otherwise keep their games forever
+            for gameId in gameIds:
+                self.sessions.pop(gameId, None)
+            writer.close()
+
+    async def handleRequest(self, line, gameIds=None):
+        """ Returns the response dict for one request line,
+            the ids of games it creates are added to gameIds
+        """
+        request = None
+        try:
+            request = json.loads(line)
+            response = await self.dispatch(request, gameIds)
+            response["ok"] = True
+        except (ValueError, KeyError, TypeError) as e:
+            response = {"ok": False, "error": str(e) or type(e).__name__}
+        if isinstance(request, dict) and "id" in request:
+            response["id"] = request["id"]
+        return response
+
+    async def dispatch(self, request, gameIds=None):
+        op = request["op"]
+        if op == "new":
+            session = JottoSession(filename=self.filename, timeBudget=self.timeBudget, scenario=self.scenario,
+                                   profile=self.profile, answersFilename=self.answersFilename)
+            state = session.start(int(request["wordLength"]))
+            gameId = self.nextGameId
+            self.nextGameId += 1
+            self.sessions[gameId] = session
+            if gameIds is not None:
+                gameIds.add(gameId)
+            return {"game": gameId, "state": state}
+
+        if op == "stats" and "game" not in request:
+            stats = JottoStats()
+            for session in self.sessions.values():
+                if session.game.stats is not None:
+                    stats.merge(session.game.stats)
+            return {"stats": stats.getStats(), "games": len(self.sessions)}
+
+        if op not in ("recommend", "feedback", "keep", "remove", "unknown", "state", "stats", "close"):
+            raise ValueError("unknown op " + repr(op))
+        session = self.getSession(request)
+        if op == "recommend":
+            return await self.recommend(session)
+        if op == "feedback":
+            return {"state": session.submitFeedback(request["guess"], request["matches"])}
+        if op == "keep":
+            return {"state": session.keepLetters(request["letters"])}
+        if op == "remove":
+            return {"state": session.removeLetters(request["letters"])}
+        if op == "unknown":
+            return {"state": session.markUnknown(request["word"])}
+        if op == "state":
+            return {"state": session.getState()}
+        if op == "stats":
+            return {"stats": session.getStats()}
+        # op == "close"
+        del self.sessions[request["game"]]
+        return {}
+
+    def getSession(self, request):
+        session = self.sessions.get(request.get("game"))
+        if session is None:
+            raise ValueError("unknown game " + repr(request.get("game")))
+        return session
+
+    async def recommend(self, session):
+        """ Returns the recommendation of a session, see JottoSession.recommend """
+        session.checkStarted()
+        game = session.game
+        if game.countWords() == 0:
+            return session.recommend()
+
+        # identical game states share one computation
+        key = game.getStateKey("recommend")
+        future = self.pending.get(key)
+        computed = future is None
+        if computed:
+            loop = asyncio.get_running_loop()
+            future = loop.run_in_executor(self.executor, _recommendSnapshot, session.getSnapshot())
+            self.numRecommendations += 1
+            self.pending[key] = future
+            future.add_done_callback(lambda _: self.pending.pop(key, None))
+        guess, search, stats = await asyncio.shield(future)
+        if computed and stats is not None and game.stats is not None:
+            # the work is counted once, by the session that asked for it first
+            game.stats.merge(stats)
+        return {"guess": guess, "wordsLeft": game.countWords(), "gameOver": guess is None, "search": search}
+
+    def close(self):
+        self.executor.shutdown(wait=False)
+
+
+
+class JottoClient:
+    """ Minimal client of a JottoServer, mostly for tests and scripts
+        Calls from concurrent tasks take turns on the connection
+    """
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.lock = asyncio.Lock()
+
+    @staticmethod
+    async def connect(host="127.0.0.1", port=8765):
+        reader, writer = await asyncio.open_connection(host, port)
+        return JottoClient(reader, writer)
+
+    async def call(self, op, **params):
+        """ Sends one request and returns its response dict """
+        params["op"] = op
+        async with self.lock:
+            self.writer.write(json.dumps(params).encode() + b"\n")
+            await self.writer.drain()
+            return json.loads(await self.reader.readline())
+
+    async def close(self):
+        self.writer.close()
+        await self.writer.wait_closed()
+
+
+
+def _loadDictionary(filename, answersFilename=None):
+    """ Loads the dictionaries in a worker process """
+    Jotto(filename, answersFilename)
+
+
+def _recommendSnapshot(snapshot):
+    """ Worker process side of JottoServer.recommend,
+        returns (guess, search details, stats or None)
+    """
+    session = JottoSession.fromSnapshot(snapshot)
+    recommendation = session.recommend()
+    return recommendation["guess"], recommendation["search"], session.getStats()
+
+
+
+async def serve(host, port, workers, filename, timeBudget=None, scenario=None, profile=False, answersFilename=None):
+    server = JottoServer(filename, workers, timeBudget=timeBudget, scenario=scenario, profile=profile,
+                         answersFilename=answersFilename)
+    listener = await server.start(host, port)
+    print("Serving jotto on " + ", ".join(str(sock.getsockname()) for sock in listener.sockets))
+    try:
+        async with listener:
+            await listener.serve_forever()
+    finally:
+        server.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve many jotto games from one process")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, default=None, help="processes computing recommendations")
+    parser.add_argument("--words", default=Jotto.DICTIONARY_FILENAME, help="word file of the words that can be guessed")
+    parser.add_argument("--answers", help="word file of the words that can be the jotto word, defaults to --words")
+    parser.add_argument("--time-budget", type=float, metavar="SECONDS", help="seconds a recommendation may search")
+    parser.add_argument("--scenario", choices=Jotto.SCENARIOS, default="worst",
+                        help="scenario recommendations are searched for one guess ahead")
+    parser.add_argument("--profile", action="store_true", help="count and time the work of every game")
+    args = parser.parse_args()
+    asyncio.run(serve(args.host, args.port, args.workers, args.words, args.time_budget, args.scenario,
+                      args.profile, args.answers))
+
+
+
+if __name__ == "__main__":
+    main()